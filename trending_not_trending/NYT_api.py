@@ -3,17 +3,22 @@ the path to the file on line 163 (beginning of the if __name__ == '__main__':).
 .yml format: the key used is 'NYT_api_key'
 '''
 
-import yaml
-import requests
-import json
 
 import matplotlib.pyplot as plt #for visualization
 import numpy as np
 
 import argparse #for command line
 
+from NYT_cache import ResponseCache
+from NYT_client import NYTClient, HITS_FIELDS
+from NYT_fetch import QuotaStore
+from NYT_planner import TrendPlanner
+from NYT_windows import period_windows, GRANULARITIES
+from NYT_baseline import BaselineStore, baseline_totals, normalize
+
 def get_NYT_request(search_term, begin_year, end_year, page=0,
-                path_to_credentials='../../credentials/credentials.yml'):
+                path_to_credentials='../../credentials/credentials.yml',
+                cache=None, client=None):
 
     '''
     parameters:
@@ -34,44 +39,35 @@ def get_NYT_request(search_term, begin_year, end_year, page=0,
                 path to the .yml file with the API key stored in the following
                 format: NYT_api_key: + space + NYT issued code
                 defaults to file credentials outside of the NYT project
+    cache: as ResponseCache, optional
+                on-disk cache of the responses (see NYT_cache.py), a cached
+                response does not send any request
+    client: as NYTClient, optional
+                reusable client (credentials read once, connections kept alive),
+                created from path_to_credentials and cache if not given
 
     returns:
     --------
     r: a request object
     '''
-    ########    authentification
-    # define the path to the credentials
-    path_to_file = path_to_credentials
-    credentials = yaml.load(open(path_to_file))
-
-    ########    building the request url
-    # define the base url
-    base_url="http://api.nytimes.com/svc/search/v2/articlesearch"
-
-    # choose response format (here, Article Search API outputs .json)
-    response_format=".json"
-
-    # make the url
-    NYT_request_url = base_url+response_format
+    ########    authentification and connection (see NYT_client.py)
+    if client is None:
+        client = NYTClient(path_to_credentials, cache=cache)
 
     ########    Sent the GET request
-    # ensure authentification
-    NYT_api_key = credentials['NYT_api_key']
-
-    # define the search parameters:
-    search_params = {'q': search_term,
-                     'begin_date': str(begin_year)+'0101',
-                     'end_date': str(end_year)+'1231',
-                     'page': page,
-                     'api-key': NYT_api_key}
+    # define the search parameters (the API key, and the list of the fields
+    # to send back, are added by the client):
+    search_params = client.search_params(search_term, str(begin_year)+'0101',
+                                         str(end_year)+'1231', page=page)
 
-    # make the request
-    r = requests.get(NYT_request_url, params=search_params)
+    # make the request (or read it from the cache)
+    r = client.get(search_params)
 
     return r
 
 def extract_num_hits(search_term, begin_year, end_year, page=0,
-                path_to_credentials='../../credentials/credentials.yml'):
+                path_to_credentials='../../credentials/credentials.yml',
+                cache=None, client=None):
     '''
     parameters:
     -----------
@@ -82,13 +78,18 @@ def extract_num_hits(search_term, begin_year, end_year, page=0,
     hits as INT
          number of articles that the search found
     '''
+    if client is None:
+        client = NYTClient(path_to_credentials, cache=cache,
+                           fields=HITS_FIELDS)
+
     # make request
-    r = get_NYT_request(search_term, begin_year, end_year,
-                    path_to_credentials=path_to_credentials)
+    r = get_NYT_request(search_term, begin_year, end_year, page=page,
+                    client=client)
 
     ########    Extract the relevant data
-    # convert the raw file (.json) to a dictionary
-    data = json.loads(r.text)
+    # convert the raw file (.json) to a dictionary (parse time recorded by
+    # the client)
+    data = client.decode(r)
 
     # get number of hits
     hits = data['response']['meta']['hits']
@@ -97,7 +98,8 @@ def extract_num_hits(search_term, begin_year, end_year, page=0,
 
 def find_trend(start_year, end_year,
               search_term,
-              path_to_credentials='../../credentials/credentials.yml'):
+              path_to_credentials='../../credentials/credentials.yml',
+              cache=None, client=None, granularity='year', baseline=None):
     '''
     parameters:
     -----------
@@ -106,24 +108,44 @@ def find_trend(start_year, end_year,
     end_year: as INT, must be higher than start_year
                 last year (included) of the range over which the trend will
                 be observed
+    granularity: as STR, default 'year'
+                'year', 'quarter', 'month' or 'week': one value per period
+    baseline: as BaselineStore, optional
+                normalized trend: the values are the shares of all the articles
+                of the periods, the totals are read from the baseline (see
+                NYT_baseline.py)
     see docstring of get_NYT_request for the other variables
 
     returns:
     --------
     list_of_values: as LIST of INT
-                hits for the year range specified
+                hits for the year range specified (one per period, in
+                chronological order)
+                (as LIST of FLOAT, the shares, with a baseline)
+
+    note: the requests (one per year, page 0 only) are sent by a TrendPlanner
+          (see NYT_planner.py), which queries the years concurrently
     '''
-    list_of_hits = []
+    if client is None:
+        client = NYTClient(path_to_credentials, cache=cache,
+                           fields=HITS_FIELDS)
+    planner = TrendPlanner(client=client)
+    dict_hits = planner.run([search_term], start_year, end_year,
+                            granularity=granularity)[search_term]['hits']
+    if baseline is not None:
+        dict_hits = normalize(dict_hits, baseline_totals(start_year, end_year,
+                                                         granularity, baseline,
+                                                         planner))
 
-    for year in range(start_year, end_year+1):
-        hits = extract_num_hits(search_term, year, year, page=0,
-                        path_to_credentials=path_to_credentials)
-        list_of_hits.append(hits)
+    list_of_hits = []
+    for period, window in period_windows(start_year, end_year, granularity):
+        list_of_hits.append(dict_hits[period])
 
     return list_of_hits
 
 def plot_trend(start_year, end_year,
-                search_term, list_of_hits, show_option=True):
+                search_term, list_of_hits, show_option=True,
+                granularity='year', normalized=False):
     '''
     parameters:
     -----------
@@ -133,23 +155,34 @@ def plot_trend(start_year, end_year,
                 year at the end of the year range to observe the trend in
     show_option: as BOOL, default True
                 show the plot directly
+    granularity: as STR, default 'year'
+                granularity used by find_trend for list_of_hits
+    normalized: as BOOL, default False
+                list_of_hits holds the shares of all the articles
 
     returns:
     --------
     fig: bar graph
     '''
     width = 1
-    range_years = range(start_year, end_year+1)
+    periods = [period for period, window
+               in period_windows(start_year, end_year, granularity)]
+    x = np.arange(len(periods))
 
     #create graph
     fig = plt.figure()
-    plt.bar(range_years, list_of_hits, width=width)
+    if normalized:
+        plt.bar(x, 100 * np.array(list_of_hits), width=width)
+    else:
+        plt.bar(x, list_of_hits, width=width)
 
     #setting labels
-    plt.ylabel('Number of hits')
-    plt.xlabel('Year')
-    plt.title("Number of hits per year for search term '{}'".format(search_term))
-    plt.xticks(np.array(range_years)+width*.5, range_years, rotation=30)
+    what = 'Share of the articles (%)' if normalized else 'Number of hits'
+    plt.ylabel(what)
+    plt.xlabel(granularity.capitalize())
+    plt.title("{} per {} for search term '{}'".format(what, granularity,
+                                                      search_term))
+    plt.xticks(x+width*.5, periods, rotation=30)
 
     if show_option:
         plt.show()
@@ -161,6 +194,15 @@ if __name__ == '__main__':
     # define the path to the credentials
     path_to_cred_file = '../../credentials/credentials.yml'
 
+    # define the path to the cache of the responses
+    path_to_cache_file = 'nyt_cache.sqlite'
+
+    # define the path to the totals of articles per period (--normalize)
+    path_to_baseline_file = 'nyt_baseline.sqlite'
+
+    # define the path to the calls sent per API key and per day
+    path_to_quota_file = 'nyt_quota.sqlite'
+
     # retrieve the information from the command line
     # for ex: $ python NYT_api.py 'Donald Trump' 1999 2015
     parser = argparse.ArgumentParser(description='Get the evolution of popularity over time')
@@ -171,6 +213,14 @@ if __name__ == '__main__':
 
     parser.add_argument('end_year', metavar='year_range_end', type=int,
                         help='the year as INT that marks the latest year queried')
+    parser.add_argument('--no-cache', dest='use_cache', action='store_false',
+                        help='always query the API, do not read or write the cache')
+    parser.add_argument('--granularity', dest='granularity', default='year',
+                        choices=GRANULARITIES,
+                        help='one bar per year (default), quarter, month or week')
+    parser.add_argument('--normalize', dest='normalize', action='store_true',
+                        help='share of all the articles of each period instead '
+                             'of the number of hits')
 
     args = parser.parse_args()
 
@@ -178,8 +228,16 @@ if __name__ == '__main__':
     terms = args.query_term[0]
     year_start = args.start_year
     year_end = args.end_year
+    cache = ResponseCache(path_to_cache_file) if args.use_cache else None
+    client = NYTClient(path_to_cred_file, cache=cache, fields=HITS_FIELDS,
+                       quota_store=QuotaStore(path_to_quota_file))
 
     list_of_hits = find_trend(start_year=year_start, end_year=year_end, search_term=terms,
-                    path_to_credentials=path_to_cred_file)
-
-    plot_trend(year_start, year_end, terms, list_of_hits)
+                    client=client, granularity=args.granularity,
+                    baseline=BaselineStore(path_to_baseline_file)
+                             if args.normalize else None)
+    if cache is not None:
+        cache.close()
+
+    plot_trend(year_start, year_end, terms, list_of_hits,
+               granularity=args.granularity, normalized=args.normalize)
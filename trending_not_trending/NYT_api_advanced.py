@@ -1,28 +1,47 @@
-import yaml
-import requests
-import json
-
 import math
 import csv
 import re
+from collections import Counter
 
 import matplotlib.pyplot as plt #for visualization
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import numpy as np
 
 from wordcloud import WordCloud
-from collections import defaultdict
 
-import StringIO #saving image as text for Javascript
+from io import BytesIO #saving image as text for Javascript
 import base64
 
 import plotly.plotly as py
 import plotly.graph_objs as go
 
 import argparse #for command line
+import requests
+
+from NYT_cache import ResponseCache
+from NYT_client import NYTClient, DOC_FIELDS
+from NYT_fetch import ProgressETA, QuotaExceeded, QuotaStore, \
+                      run_concurrently
+from NYT_planner import TrendPlanner
+from NYT_harvest import stream_periods
+from NYT_sink import NDJSONSink
+from NYT_windows import period_windows, period_label, period_key, \
+                        GRANULARITIES
+from NYT_store import TrendStore, year_runs
+from NYT_journal import HarvestJournal, job_id
+from NYT_baseline import BaselineStore, baseline_totals, normalize
+from NYT_dedup import Deduplicator
+from NYT_keywords import KeywordStore
+from NYT_cooccurrence import CooccurrenceGraph, write_graphs
+from NYT_sketch import HeavyHitters, write_emerging
+from NYT_render import render_wordclouds, ImageCache, EXTENSIONS
+from NYT_dashboard import write_offline_dashboard
 
 def get_all_NYT_data(search_term, begin_year, end_year,
                 path_to_credentials='../../credentials/credentials.yml',
-                verbose=True):
+                verbose=True, rate_limiter=None, progress=None, max_workers=5,
+                cache=None, client=None):
     '''
     caveat: we are not taking into account the fact that NY Times will not give
             more than 100 pages back.
@@ -47,50 +66,50 @@ def get_all_NYT_data(search_term, begin_year, end_year,
                 defaults to file credentials outside of the NYT project
     verbose: as BOOL, defaults to True
                 prints status information in the terminal
+    rate_limiter: as RateLimiter, optional
+                shared token bucket keeping the requests within the API limits,
+                a new one is created if not given
+    progress: as ProgressETA, optional
+                shared progress report, the pages of this query are added to
+                its total
+    max_workers: as INT, defaults to 5
+                number of pages fetched concurrently
+    cache: as ResponseCache, optional
+                on-disk cache of the responses (see NYT_cache.py), cached pages
+                are not requested again
+    client: as NYTClient, optional
+                reusable client (credentials read once, connections kept alive),
+                created from path_to_credentials, cache and rate_limiter if
+                not given
 
     returns:
     --------
     hits as INT, the number of queries
     a list of the dictionaries containing data['response']['docs']
     '''
-    ########    authentification
-    # define the path to the credentials
-    path_to_file = path_to_credentials
-    credentials = yaml.load(open(path_to_file))
-
-    ########    building the request url
-    # define the base url
-    base_url="http://api.nytimes.com/svc/search/v2/articlesearch"
-
-    # choose response format (here, Article Search API outputs .json)
-    response_format=".json"
-
-    # make the url
-    NYT_request_url = base_url+response_format
+    ########    authentification and connection (see NYT_client.py)
+    # the client shares the API limits between all the concurrent requests
+    if client is None:
+        client = NYTClient(path_to_credentials, cache=cache,
+                           rate_limiter=rate_limiter)
 
-    ########    Prepare the GET request
-    # ensure authentification
-    NYT_api_key = credentials['NYT_api_key']
-
-    # define the search parameters:
-    search_params = {'q': search_term,
-                     'begin_date': str(begin_year)+'0101',
-                     'end_date': str(end_year)+'1231',
-                     'api-key': NYT_api_key}
+    # define the search parameters (the API key is added by the client):
+    search_params = client.search_params(search_term, str(begin_year)+'0101',
+                                         str(end_year)+'1231')
 
     ########    Look for the number of hits, and therefore pages to go through
     # make the first request
-    r = requests.get(NYT_request_url, params=search_params)
+    r = client.get(search_params)
 
     # convert .json result to a dictionary
-    data=json.loads(r.text)
+    data = client.decode(r)
 
     # extract number of hits
     hits = data['response']['meta']['hits']
     if verbose: print("number of hits: ", str(hits))
 
     # find the number of pages
-    num_pages = int(math.ceil(hits/10))
+    num_pages = int(math.ceil(hits/10.))
     if verbose:
         print("number of pages to query: ", str(num_pages))
         if num_pages > 100:
@@ -98,24 +117,31 @@ def get_all_NYT_data(search_term, begin_year, end_year,
                    ' only 100 pages will be obtained')
     num_pages = min(num_pages, 100)
     ########    Gather all the documents
-    all_docs = []
-
-    for num_page in range(num_pages):
-        if verbose: print("collecting page", str(num_page))
+    own_progress = progress is None
+    if own_progress:
+        progress = ProgressETA(label='pages', verbose=verbose)
+    progress.add_total(num_pages - 1)
 
+    def get_page_docs(num_page):
         # set the page parameter in the search term
-        search_params['page'] = num_page
+        page_params = dict(search_params, page=num_page)
 
         # make request for that specific page
-        r = requests.get(base_url+response_format, params=search_params)
+        r = client.get(page_params)
 
-        # convert to a dictionary
-        data = json.loads(r.text)
+        # convert to a dictionary and extract the docs (list of dictionaries)
+        data = client.decode(r)
+        return data['response']['docs']
 
-        # extract the docs (list of dictionaries)
-        docs = data['response']['docs']
+    # page 0 is already known from the first request
+    pages = run_concurrently(get_page_docs, range(1, num_pages),
+                             max_workers=max_workers, progress=progress)
+    if own_progress:
+        progress.close()
 
-        # add those docs to the big list
+    # add those docs to the big list, in the order of the pages
+    all_docs = list(data['response']['docs']) if num_pages > 0 else []
+    for docs in pages:
         all_docs += docs
 
     return hits, all_docs
@@ -137,18 +163,80 @@ def extract_info(doc):
         list_keywords.append(d['value'])
     return year, list_keywords
 
-def regroup_wanted_data(all_docs):
-    dict_keywords = defaultdict(list)
+def regroup_wanted_data(all_docs, dict_keywords=None, dedup=None, scope='',
+                        graph=None, hitters=None):
+    '''
+    parameters
+    ----------
+    all_docs: iterable of the documents (a list, or a stream of documents)
+    dict_keywords: as KeywordStore, optional
+            keywords already regrouped, updated with the keywords of all_docs
+            (see NYT_keywords.py)
+    dedup: as Deduplicator, optional
+            the articles already seen (same '_id' in the scope) are skipped
+            (see NYT_dedup.py)
+    scope: as STR, defaults to ''
+            scope of the de-duplication, e.g. the search term
+    graph: as CooccurrenceGraph, optional
+            the keywords of each article are also added to this graph of the
+            keywords found together (see NYT_cooccurrence.py)
+    hitters: as HeavyHitters, optional
+            the keywords of each article are also added to these bounded
+            summaries of the frequent keywords (see NYT_sketch.py)
+
+    returns
+    -------
+    KeywordStore, the keywords counted per year
+    '''
+    if dict_keywords is None:
+        dict_keywords = KeywordStore()
     for doc in all_docs:
+        if dedup is not None and not dedup.filter(scope, [doc]):
+            continue
         year, list_keywords = extract_info(doc)
-        dict_keywords[year].extend(list_keywords)
+        dict_keywords.add(year, list_keywords)
+        if graph is not None:
+            graph.add(year, list_keywords)
+        if hitters is not None:
+            hitters.add(year, list_keywords)
+
+    return dict_keywords
+
+def regroup_by_period(docs, period, dict_keywords, graph=None, hitters=None):
+    '''
+    same as regroup_wanted_data, for documents that are known to belong to
+    the period (their request window), whatever the granularity
 
+    parameters
+    ----------
+    docs: iterable of the documents
+    period: key of the period in dict_keywords
+    dict_keywords: as KeywordStore, updated with the keywords of docs
+    graph: as CooccurrenceGraph, optional
+            updated with the keywords of each article of docs
+    hitters: as HeavyHitters, optional
+            updated with the keywords of each article of docs
+    '''
+    for doc in docs:
+        year, list_keywords = extract_info(doc)
+        dict_keywords.add(period, list_keywords)
+        if graph is not None:
+            graph.add(period, list_keywords)
+        if hitters is not None:
+            hitters.add(period, list_keywords)
     return dict_keywords
 
 def wraper_function_data(start_year, end_year, search_term,
                         path_to_credentials='../../credentials/credentials.yml',
-                         verbose=False):
+                         verbose=False, rate_limiter=None, max_workers=5,
+                         cache=None, planner=None, full_harvest=False,
+                         client=None, sink=None, granularity='year'):
     '''
+    the requests go through a TrendPlanner (see NYT_planner.py): each page is
+    requested only once and page 0 gives both the hits and the first documents.
+    The years are queried concurrently, all the requests share the same
+    RateLimiter so that the API limits hold for the whole range
+
     parameters
     ----------
     start_year: as INT
@@ -158,33 +246,239 @@ def wraper_function_data(start_year, end_year, search_term,
     search_term: as STR
                 the search term for the query to the NYT api
     verbose: as BOOL, defaults to False
-            prints to terminal which year is being queried
+            prints the progress (pages collected and time left) to terminal
+    rate_limiter: as RateLimiter, optional
+            shared token bucket, a new one is created if not given
+    max_workers: as INT, defaults to 5
+            number of requests prepared concurrently
+    cache: as ResponseCache, optional
+            on-disk cache of the responses (see NYT_cache.py)
+    planner: as TrendPlanner, optional
+            planner to reuse the responses of previous jobs, a new one is
+            created if not given (and then uses the other parameters)
+    full_harvest: as BOOL, defaults to False
+            False: at most 100 pages (1000 documents) per year are obtained
+            True: the years are split in smaller date windows to get past the
+                  100 pages cap (see NYT_harvest.py), more requests are sent
+    client: as NYTClient, optional
+            reusable client (see NYT_client.py), used to create the planner
+    sink: as NDJSONSink, optional
+            the documents are also written to this file (see NYT_sink.py)
+    granularity: as STR, defaults to 'year'
+            'quarter', 'month' or 'week' for a finer trend, the keys of the
+            dictionnaries are then the periods (see NYT_windows.py)
 
     returns
     -------
     dictionnary where keys are the years in the time range
                       values are the number of hits for the query that year
-    dictionnary where keys are the years in the time range
-                      values are lists of the keywords found that year
-    '''
-    dict_hits = {}
-    all_docs = []
-    for year in range(start_year, end_year+1):
-        if verbose: print ('year {}'.format(year))
-        hits, docs = get_all_NYT_data(search_term, year, year,
-                                    path_to_credentials = path_to_credentials,
-                                    verbose=False)
-        dict_hits[year] = hits
-        all_docs += docs
+    KeywordStore with the keywords found each year (see NYT_keywords.py),
+                      store[year] gives the list of the keywords of the year
+    '''
+    if planner is None:
+        if client is None:
+            client = NYTClient(path_to_credentials, cache=cache,
+                               rate_limiter=rate_limiter)
+        planner = TrendPlanner(client=client, max_workers=max_workers,
+                               verbose=verbose)
+
+    d_hits, d_keywords = wraper_function_batch(start_year, end_year,
+                                [search_term], verbose=verbose,
+                                planner=planner, full_harvest=full_harvest,
+                                sink=sink, granularity=granularity)
+    return d_hits[search_term], d_keywords[search_term]
+
+def wraper_function_batch(start_year, end_year, search_terms,
+                          path_to_credentials='../../credentials/credentials.yml',
+                          verbose=False, max_workers=5, client=None,
+                          planner=None, full_harvest=False, sink=None,
+                          granularity='year', dedup=None, graphs=None,
+                          d_hitters=None):
+    '''
+    batch version of wraper_function_data: all the terms go through the same
+    planner (one client, one cache, one rate limiter), so the requests of all
+    the terms are scheduled together
+
+    the documents are streamed: the keywords of each page are regrouped as
+    soon as the page arrives, then the page is released. An article sent back
+    twice for a term (same '_id') is only counted once
+
+    parameters
+    ----------
+    start_year: as INT
+                first year of the time range to consider
+    end_year: as INT
+                last year of the time range to consider (year included)
+    search_terms: as LIST of STR
+                the search terms for the queries to the NYT api
+    sink: as NDJSONSink, optional
+                the documents are also written to this file (see NYT_sink.py)
+    granularity: as STR, defaults to 'year'
+                'year', 'quarter', 'month' or 'week': the hits and keywords are
+                given per period instead of per year (see NYT_windows.py)
+    dedup: as Deduplicator, optional
+                ids of the articles already counted for each term, a new one
+                is created if not given (see NYT_dedup.py)
+    graphs: as DICT, optional
+                keys are the search terms, values their CooccurrenceGraph,
+                updated with the keywords of the articles found together
+                (see NYT_cooccurrence.py)
+    d_hitters: as DICT, optional
+                keys are the search terms, values their HeavyHitters, updated
+                with the keywords of the articles (see NYT_sketch.py)
+    see docstring of wraper_function_data for the other variables
 
-    d_keywords = regroup_wanted_data(all_docs)
-    return dict_hits, d_keywords
+    returns
+    -------
+    dictionnary where keys are the search terms
+                      values are the dict_hits of wraper_function_data
+    dictionnary where keys are the search terms
+                      values are the d_keywords of wraper_function_data
+    (the keys of dict_hits and d_keywords are the periods, the years as INT
+    for the 'year' granularity)
+    '''
+    if planner is None:
+        if client is None:
+            client = NYTClient(path_to_credentials)
+        planner = TrendPlanner(client=client, max_workers=max_workers,
+                               verbose=verbose)
+
+    list_periods = period_windows(start_year, end_year, granularity)
+    if dedup is None:
+        dedup = Deduplicator()
+
+    if full_harvest:
+        def stream():
+            for search_term in search_terms:
+                for period, docs in stream_periods(search_term, start_year,
+                                                   end_year, granularity,
+                                                   planner=planner,
+                                                   verbose=verbose):
+                    yield search_term, period, docs
+        pages = stream()
+    else:
+        pages = planner.stream(search_terms, start_year, end_year, granularity)
+
+    d_keywords = dict((search_term, KeywordStore())
+                      for search_term in search_terms)
+    for search_term, period, docs in pages:
+        docs = dedup.filter(search_term, docs)
+        if sink is not None:
+            sink.write(search_term, docs)
+        regroup_by_period(docs, period, d_keywords[search_term],
+                          graphs[search_term] if graphs is not None else None,
+                          d_hitters[search_term] if d_hitters is not None
+                          else None)
+    if verbose:
+        print(planner.report())
+        print(dedup.report())
+
+    d_hits = {}
+    for search_term in search_terms:
+        d_hits[search_term] = dict((period, planner.hits(search_term, window))
+                                   for period, window in list_periods)
+    return d_hits, d_keywords
+
+def refresh_trends(start_year, end_year, search_terms, store,
+                   path_to_credentials='../../credentials/credentials.yml',
+                   verbose=False, max_workers=5, client=None, planner=None,
+                   full_harvest=False, sink=None, dedup=None):
+    '''
+    incremental version of wraper_function_batch: only the years missing from
+    the store, or stale (e.g. the current year), are queried. The new results
+    are saved in the store and merged with the stored ones.
+
+    parameters
+    ----------
+    store: as TrendStore
+           results per (term, year) of the previous runs (see NYT_store.py)
+    see docstring of wraper_function_batch for the other variables
+
+    returns
+    -------
+    same as wraper_function_batch, for the whole time range
+    '''
+    if planner is None:
+        if client is None:
+            client = NYTClient(path_to_credentials)
+        planner = TrendPlanner(client=client, max_workers=max_workers,
+                               verbose=verbose)
+
+    years = range(start_year, end_year+1)
+    d_hits, d_keywords = {}, {}
+    for search_term in search_terms:
+        stale = store.stale_years(search_term, years,
+                                  full_harvest=full_harvest)
+        if verbose:
+            print('{}: {} years stored, {} to query'\
+                  .format(search_term, len(years) - len(stale), len(stale)))
+        for run_start, run_end in year_runs(stale):
+            new_hits, new_keywords = wraper_function_batch(run_start, run_end,
+                                        [search_term], verbose=verbose,
+                                        planner=planner,
+                                        full_harvest=full_harvest, sink=sink,
+                                        dedup=dedup)
+            store.save(search_term, new_hits[search_term],
+                       new_keywords[search_term], full_harvest=full_harvest)
+        d_hits[search_term], d_keywords[search_term] = \
+                                        store.load(search_term, years)
+    return d_hits, d_keywords
+
+def read_terms_file(filename):
+    '''
+    parameters
+    ----------
+    filename: as STR
+              text file with one search term per line, empty lines and lines
+              starting with '#' are ignored
+
+    returns
+    -------
+    list of the search terms (without repetition, in the order of the file)
+    '''
+    terms = []
+    with open(filename) as f:
+        for line in f:
+            term = line.strip()
+            if term and not term.startswith('#') and term not in terms:
+                terms.append(term)
+    return terms
+
+def keyword_frequencies(d_keywords, max_words=200):
+    '''
+    aim: input of the wordclouds, the keywords are counted once (by the
+         KeywordStore) and given with their counts, 'New York City' or
+         'Clinton, Bill' are kept as they are (no text to split again)
+
+    parameters
+    ----------
+    d_keywords: as KeywordStore (see NYT_keywords.py), or dictionary with
+                years as keys and a list of keywords as value
+    max_words: as INT, defaults to 200 (as WordCloud)
+                number of keywords kept per period, the most frequent
+
+    returns
+    -------
+    dictionary with the same keys as d_keywords, and values as a DICT
+                keyword -> count
+    '''
+    d_frequencies = {}
+    for period in d_keywords.keys():
+        if isinstance(d_keywords, KeywordStore):
+            top = d_keywords.top_k(period, max_words)
+        else:
+            top = Counter(d_keywords[period]).most_common(max_words)
+        d_frequencies[period] = dict(top)
+    return d_frequencies
 
 def handle_multiple_words(d_keywords):
     '''
     aim: some keywords should be parsed together 'New York City', the choice I made
          is to link them 'New_York_City'
 
+    note: only kept for the text input of WordCloud().generate, the wordclouds
+          are made from the counts of keyword_frequencies
+
     parameters
     ----------
     d_keywords: dictionary with years as keys and a list of keywords as value
@@ -197,40 +491,53 @@ def handle_multiple_words(d_keywords):
     '''
     d_value_as_string ={}
     for year in d_keywords.keys():
-        value = ''
-        for item in d_keywords[year]:
-            value += ' '
-            word = '_'.join(item.split(' '))
-            word = re.sub(',','',word)
-            value += word
-        d_value_as_string[year] = value
+        words = [re.sub(',', '', '_'.join(item.split(' ')))
+                 for item in d_keywords[year]]
+        d_value_as_string[year] = ' ' + ' '.join(words) if words else ''
     return d_value_as_string
 
-def produce_wordclouds(d_value_as_string, plot_option=True):
+def produce_wordclouds(d_frequencies, plot_option=True):
     '''
-    aim: produce wordclouds, with the size indicating the rank (not the frequency)
+    aim: produce wordclouds, with the size indicating the frequency of the
+    keyword
     based on github 'wordcloud'
 
     parameters
     ----------
-    d_value_as_string: as DICT
-                       dictionary with years as keys and values as a STR
-                       value: the keywords joined with '_' when they are parsed together
-                       and with ' ' otherwise
+    d_frequencies: as DICT
+                   dictionary with years as keys and values as a DICT
+                   keyword -> count (see keyword_frequencies)
+                   a STR value (see handle_multiple_words) is still accepted,
+                   it is split and counted by WordCloud
     plot_option: as BOOL
-                shows the plots by default
+                shows the plots by default, otherwise the figures are made
+                outside of pyplot (freed with the dictionary, nothing to close)
 
     returns
     -------
     dictionnary with years as keys and the matplotlib graphs as values
+    (the periods without keywords have no wordcloud)
+
+    note: the dashboard renders the images directly, without matplotlib (see
+          NYT_render.py)
     '''
     dict_figs = {}
-    for year in d_value_as_string:
-        fig = plt.figure()
-        text= d_value_as_string[year]
-        wordcloud = WordCloud().generate(text)
-        plt.imshow(wordcloud)
-        plt.axis("off")
+    for year in d_frequencies:
+        frequencies = d_frequencies[year]
+        if not frequencies:
+            continue
+        if isinstance(frequencies, dict):
+            wordcloud = WordCloud().generate_from_frequencies(frequencies)
+        else:
+            wordcloud = WordCloud().generate(frequencies)
+        if plot_option:
+            fig = plt.figure()
+        else:
+            fig = Figure()
+            FigureCanvasAgg(fig)
+        ax = fig.add_subplot(111)
+        ax.imshow(wordcloud)
+        ax.axis("off")
         if plot_option: plt.show()
         dict_figs[year] = fig
     return dict_figs
@@ -252,55 +559,87 @@ def save_images_as_str(dict_figs):
     dict_str: as DICT
             key is the year
             value is the wordcloud stored as a string
+
+    the figures opened with pyplot are closed once saved
     '''
     dict_str = {}
     for year in dict_figs:
         fig = dict_figs[year]
-        output = StringIO.StringIO()
-        fig.savefig(output, transparent=True, bbox_inches='tight')
+        output = BytesIO()
+        fig.savefig(output, format='png', transparent=True,
+                    bbox_inches='tight')
+        plt.close(fig)
 
-        encoded_string = base64.b64encode(output.getvalue())
+        encoded_string = base64.b64encode(output.getvalue()).decode('ascii')
         dict_str[year] = encoded_string
     return dict_str
 
-def for_js_dictionary(dict_str):
+def js_key(key):
+    '''
+    key of the Javascript dictionary: 'year-2014' for a year (INT), the
+    comparison keys (STR) are kept as they are
+    '''
+    if isinstance(key, int):
+        return 'year-' + str(key)
+    return key
+
+def comparison_key(term_index, period, granularity='year'):
+    '''
+    key linking a bar of the comparison dashboard to its image: the bars of
+    the i-th term are in the i-th trace of the plotly graph
+    '''
+    return 'term-{}-{}'.format(term_index, period_key(period, granularity))
+
+def for_js_dictionary(dict_str, image_format='png'):
     '''
     for the main.js, a Javascript dictionary structure is needed to link the bars to an image
-       'year-2014': 'data:image/jpeg;base64,iVBORw0KGgoAAAANSUhEUgAA ... ==',
-       'year-2015': 'data:image/jpeg;base64,iVBORw0 ...',
+       'year-2014': 'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAA ... ==',
+       'year-2015': 'data:image/png;base64,iVBORw0 ...',
 
     parameters
     ----------
     dict_str: as DICT
         key is the year
         value is the wordcloud stored as a string
+    image_format: as STR, defaults to 'png'
+        format of the images, 'png' or 'webp' (type of the data URI)
 
     returns
     -------
     STR, with the text for the Javascript dictionary
+
+    note: for the comparison dashboard, the keys of dict_str are the STR made
+          by comparison_key (e.g. 'term-0-year-2014'), used as they are
     '''
     middle_str = ''
     for year in dict_str:
-        temp_str = '''   'year-''' + str(year) + '''': 'data:image/jpeg;base64,''' + dict_str[year] +'''',
+        temp_str = '''   \'''' + js_key(year) + '''': 'data:image/''' + image_format + ''';base64,''' + dict_str[year] +'''',
         '''
         middle_str += temp_str
     return middle_str
 
-def plotly_url(start_year, end_year, dict_hits):
+def plotly_url(start_year, end_year, dict_hits, granularity='year',
+               normalized=False):
     '''
     generates the url for the bar chart
     start_year and end_year must be included in dict_hits.keys()
 
     dict_hits as DICT
               key is year, value is the hits for that year
+              (key is the period for the other granularities, see
+              NYT_windows.py)
+    normalized: as BOOL, defaults to False
+              the values of dict_hits are shares of all the articles (see
+              NYT_baseline.py), shown as percentages
     '''
     #####  data
     # x-values
-    range_years = range(start_year, end_year + 1)
-    years_string = ['year ' + str(year) for year in range_years]
+    periods = [period for period, window
+               in period_windows(start_year, end_year, granularity)]
+    years_string = [period_label(period, granularity) for period in periods]
 
     # y-values
-    list_of_hits = [dict_hits[year] for year in range_years]
+    list_of_hits = [dict_hits[period] for period in periods]
 
     data = [go.Bar(
                 x=years_string,
@@ -308,7 +647,8 @@ def plotly_url(start_year, end_year, dict_hits):
         )]
 
     layout = go.Layout(
-        xaxis=dict(tickangle=-45)
+        xaxis=dict(tickangle=-45),
+        yaxis=dict(tickformat='.2%') if normalized else dict()
     )
 
     #### get fig
@@ -316,9 +656,50 @@ def plotly_url(start_year, end_year, dict_hits):
     plot_url = py.plot(fig)
     return plot_url
 
-def writing_js_file(dict_str, filename='main.js'):
+def plotly_url_comparison(start_year, end_year, d_hits, granularity='year',
+                          normalized=False):
+    '''
+    generates the url for the grouped bar chart comparing several terms
+    start_year and end_year must be included in the keys of each dict_hits
+
+    d_hits as DICT
+              key is the search term, value is the dict_hits for that term
+              (the order of the traces is the order of the sorted terms)
+    normalized: as BOOL, defaults to False
+              see docstring of plotly_url
+    '''
+    periods = [period for period, window
+               in period_windows(start_year, end_year, granularity)]
+    years_string = [period_label(period, granularity) for period in periods]
+
+    data = [go.Bar(x=years_string,
+                   y=[d_hits[term][period] for period in periods],
+                   name=term)
+            for term in sorted(d_hits)]
+
+    layout = go.Layout(
+        barmode='group',
+        xaxis=dict(tickangle=-45),
+        yaxis=dict(tickformat='.2%') if normalized else dict()
+    )
+
+    fig = go.Figure(data=data, layout=layout)
+    plot_url = py.plot(fig)
+    return plot_url
+
+def writing_js_file(dict_str, filename='main.js', by_trace=False,
+                    image_format='png'):
     '''
     writes the main.js file necessary for plotly interactivity with images on hover
+
+    by_trace: as BOOL, defaults to False
+              True for the comparison dashboard, the image is looked up with the
+              trace (term) of the bar as well as the period (see comparison_key)
+    image_format: as STR, defaults to 'png'
+              format of the images (see for_js_dictionary)
+
+    note: every image is inlined in main.js, see NYT_dashboard.py for the
+          offline dashboard loading the images on hover
     '''
 
     top_part = '''(function main() {
@@ -367,17 +748,21 @@ def writing_js_file(dict_str, filename='main.js'):
     var artistToUrl = {
     '''
 
-    middle_part = for_js_dictionary(dict_str)
+    middle_part = for_js_dictionary(dict_str, image_format)
 
     bottom_part = '''};
 
     var blankImg = 'data:image/gif;base64,R0lGODlhAQABAAD/ACwAAAAAAQABAAACADs=';
 
+    var byTrace = ''' + ('true' if by_trace else 'false') + ''';
+
     Plot.onHover = function(message) {
         var artist = message.points[0].x
             .toLowerCase()
             .replace(/ /g, '-');
 
+        if(byTrace) artist = 'term-' + message.points[0].curveNumber + '-' + artist;
+
         var imgSrc = blankImg;
 
         if(artistToUrl[artist] !== undefined) imgSrc = artistToUrl[artist];
@@ -448,36 +833,239 @@ if __name__ == '__main__':
     # define the path to the credentials (for NYT API)
     path_to_cred_file = '../../credentials/credentials.yml'
 
+    # define the path to the cache of the responses
+    path_to_cache_file = 'nyt_cache.sqlite'
+
+    # define the path to the stored results per term and year (--refresh)
+    path_to_store_file = 'nyt_trends.sqlite'
+
+    # define the path to the journal of the jobs in progress (--resume)
+    path_to_journal_file = 'nyt_journal.sqlite'
+
+    # define the path to the totals of articles per period (--normalize)
+    path_to_baseline_file = 'nyt_baseline.sqlite'
+
+    # define the path to the calls sent per API key and per day
+    path_to_quota_file = 'nyt_quota.sqlite'
+
+    # define the path to the wordclouds already rendered
+    path_to_image_cache = 'nyt_images'
+
     # retrieve the information from the command line
     # for ex: $ python NYT_api.py 'Donald Trump' 1999 2015
     parser = argparse.ArgumentParser(description='Get the evolution of popularity over time')
-    parser.add_argument('query_term', metavar='q', type=str, nargs='+',
+    parser.add_argument('query_term', metavar='q', type=str, nargs='*',
                         help='a string used as the search term for the query')
     parser.add_argument('start_year', metavar='year_range_start', type=int,
                         help='the year as INT that marks the earliest year queried')
 
     parser.add_argument('end_year', metavar='year_range_end', type=int,
                         help='the year as INT that marks the latest year queried')
+    parser.add_argument('--no-cache', dest='use_cache', action='store_false',
+                        help='always query the API, do not read or write the cache')
+    parser.add_argument('--full', dest='full_harvest', action='store_true',
+                        help='split the years in date windows to get all the '
+                             'articles, not only the first 1000 per year')
+    parser.add_argument('--terms-file', dest='terms_file', type=str,
+                        help='text file with one search term per line, all the '
+                             'terms are compared on one dashboard')
+    parser.add_argument('--save-docs', dest='docs_file', type=str,
+                        help='write the documents to this NDJSON file as they '
+                             'arrive (compressed if it ends with .gz)')
+    parser.add_argument('--refresh', dest='refresh', action='store_true',
+                        help='reuse the results stored by previous runs, only '
+                             'the new (or current) years are queried')
+    parser.add_argument('--granularity', dest='granularity', default='year',
+                        choices=GRANULARITIES,
+                        help='one bar per year (default), quarter, month or '
+                             'week')
+    parser.add_argument('--resume', dest='resume', action='store_true',
+                        help='continue the previous job where it stopped, the '
+                             'pages already received are not requested again')
+    parser.add_argument('--normalize', dest='normalize', action='store_true',
+                        help='share of all the articles of each period instead '
+                             'of the number of hits')
+    parser.add_argument('--graph', dest='graph_file', type=str,
+                        help='write the graph of the keywords found together '
+                             '(top edges per keyword and period) to this JSON '
+                             'file')
+    parser.add_argument('--emerging', dest='emerging_file', type=str,
+                        help='write the top keywords and the rising keywords '
+                             '(lift from one period to the next) to this JSON '
+                             'file')
+    parser.add_argument('--processes', dest='processes', type=int,
+                        help='number of processes rendering the wordclouds '
+                             '(one per core by default)')
+    parser.add_argument('--image-size', dest='image_size', type=str,
+                        default='400x200',
+                        help='size of the wordclouds in pixels, WIDTHxHEIGHT')
+    parser.add_argument('--image-format', dest='image_format', default='png',
+                        choices=sorted(EXTENSIONS),
+                        help='format of the wordclouds (webp is smaller)')
+    parser.add_argument('--offline', dest='offline', action='store_true',
+                        help='draw the bar chart in the page instead of '
+                             'plot.ly, the wordclouds are separate files '
+                             'loaded on hover')
+    parser.add_argument('--no-image-cache', dest='use_image_cache',
+                        action='store_false',
+                        help='render all the wordclouds again, do not read or '
+                             'write the images already rendered')
+    parser.add_argument('--metrics', dest='metrics_file', type=str,
+                        help='write the metrics of the run (latency, retries, '
+                             'bytes, cache hits...) to this JSON file')
+    parser.add_argument('--prometheus', dest='prometheus_file', type=str,
+                        help='write the metrics of the run to this Prometheus '
+                             'textfile')
 
     args = parser.parse_args()
 
     #search parameters
-    terms = args.query_term[0]
+    terms = list(args.query_term)
+    if args.terms_file:
+        terms += [term for term in read_terms_file(args.terms_file)
+                  if term not in terms]
+    if not terms:
+        parser.error('give a search term or a --terms-file')
     year_start = args.start_year
     year_end = args.end_year
-
-    print ('getting the data from NYT API')
-    dict_hits, d_keywords = wraper_function_data(year_start, year_end,
-                                terms, path_to_cred_file)
+    granularity = args.granularity
+    if args.refresh and granularity != 'year':
+        parser.error('--refresh stores the results per year only')
+    try:
+        image_width, image_height = [int(size) for size
+                                     in args.image_size.lower().split('x')]
+    except ValueError:
+        parser.error('--image-size is WIDTHxHEIGHT, e.g. 400x200')
+    if args.refresh and args.graph_file:
+        parser.error('--graph needs the articles, not stored by --refresh')
+    if args.refresh and args.emerging_file:
+        parser.error('--emerging needs the articles, not stored by --refresh')
+    cache = ResponseCache(path_to_cache_file) if args.use_cache else None
+    # the job is the command without --resume (the same command resumes it)
+    job = job_id(dict(vars(args), query_term=terms, resume=None))
+    journal = HarvestJournal(path_to_journal_file, resume=args.resume, job=job)
+    client = NYTClient(path_to_cred_file, cache=cache, fields=DOC_FIELDS,
+                       journal=journal,
+                       quota_store=QuotaStore(path_to_quota_file))
+    metrics = client.metrics
+    sink = NDJSONSink(args.docs_file) if args.docs_file else None
+    graphs = dict((term, CooccurrenceGraph()) for term in terms) \
+             if args.graph_file else None
+    d_hitters = dict((term, HeavyHitters()) for term in terms) \
+                if args.emerging_file else None
+
+    try:
+        with metrics.stage('fetch'):
+            if args.refresh:
+                print ('getting the data from the store and NYT API')
+                d_hits, d_keywords = refresh_trends(year_start, year_end, terms,
+                                            TrendStore(path_to_store_file),
+                                            verbose=True, client=client,
+                                            full_harvest=args.full_harvest,
+                                            sink=sink)
+            else:
+                print ('getting the data from NYT API')
+                d_hits, d_keywords = wraper_function_batch(year_start,
+                                            year_end, terms, verbose=True,
+                                            client=client,
+                                            full_harvest=args.full_harvest,
+                                            sink=sink, granularity=granularity,
+                                            graphs=graphs,
+                                            d_hitters=d_hitters)
+    except (QuotaExceeded, KeyboardInterrupt) as e:
+        print (journal.report())
+        parser.exit(1, 'the job stopped ({}), run the same command with '
+                       '--resume to continue it\n'.format(
+                                            e.__class__.__name__))
+    except requests.HTTPError:
+        # the pages received so far are in the journal, --resume starts from
+        # there once the API answers again
+        print (journal.report())
+        raise
+    if args.normalize:
+        print ('getting the total of articles per period')
+        with metrics.stage('baseline'):
+            totals = baseline_totals(year_start, year_end, granularity,
+                                     BaselineStore(path_to_baseline_file),
+                                     TrendPlanner(client=client))
+        d_hits = dict((term, normalize(dict_hits, totals))
+                      for term, dict_hits in d_hits.items())
+    if cache is not None:
+        cache.close()
+    print (journal.report())
+    print (client.bytes_report())
+    if len(client.api_keys) > 1:
+        print (client.keys.report())
+    print (metrics.report())
+    if sink is not None:
+        sink.close()
+        print ('{} documents saved in {}'.format(sink.count, args.docs_file))
+
+    image_cache = ImageCache(path_to_image_cache) if args.use_image_cache \
+                  else None
     print ('making the wordclouds')
-    d_linked_keywords = handle_multiple_words(d_keywords)
-    dict_figs = produce_wordclouds(d_linked_keywords, plot_option=False)
-    dict_str = save_images_as_str(dict_figs)
-    print('making the bar chart')
-    url = plotly_url(year_start, year_end, dict_hits)
-    print ('preparing files')
-    writing_js_file(dict_str, 'main.js')
-    writing_html_file(url, 'main.js', 'index.html')
+    with metrics.stage('wordclouds'):
+        # the wordclouds of all the terms are rendered by the same pool, the
+        # keys are (index of the term in the sorted terms, period)
+        d_frequencies = {}
+        for i, term in enumerate(sorted(d_hits)):
+            for period, frequencies \
+                    in keyword_frequencies(d_keywords[term]).items():
+                d_frequencies[(i, period)] = frequencies
+        images = render_wordclouds(d_frequencies, args.processes,
+                                   image_width, image_height,
+                                   args.image_format, cache=image_cache)
+    if image_cache is not None:
+        print (image_cache.report())
+
+    if graphs is not None:
+        with metrics.stage('graph'):
+            write_graphs(graphs, args.graph_file, granularity)
+        print ('graph of the keywords saved in {}'.format(args.graph_file))
+    if d_hitters is not None:
+        for term in sorted(d_hitters):
+            print ('rising keywords for {}'.format(term))
+            print (d_hitters[term].report(granularity))
+        write_emerging(d_hitters, args.emerging_file, granularity)
+        print ('rising keywords saved in {}'.format(args.emerging_file))
+
+    if args.offline:
+        print ('preparing files')
+        with metrics.stage('dashboard'):
+            write_offline_dashboard(year_start, year_end, d_hits, images,
+                                    granularity=granularity,
+                                    normalized=args.normalize,
+                                    image_format=args.image_format)
+    else:
+        if len(terms) == 1:
+            dict_str = dict((period_key(period, granularity),
+                             base64.b64encode(image).decode('ascii'))
+                            for (i, period), image in images)
+            print('making the bar chart')
+            with metrics.stage('bar chart'):
+                url = plotly_url(year_start, year_end, d_hits[terms[0]],
+                                 granularity, normalized=args.normalize)
+            by_trace = False
+        else:
+            dict_str = dict((comparison_key(i, period, granularity),
+                             base64.b64encode(image).decode('ascii'))
+                            for (i, period), image in images)
+            print('making the comparison bar chart')
+            with metrics.stage('bar chart'):
+                url = plotly_url_comparison(year_start, year_end, d_hits,
+                                            granularity,
+                                            normalized=args.normalize)
+            by_trace = True
+
+        print ('preparing files')
+        writing_js_file(dict_str, 'main.js', by_trace=by_trace,
+                        image_format=args.image_format)
+        writing_html_file(url, 'main.js', 'index.html')
+
+    if args.metrics_file:
+        metrics.write_json(args.metrics_file)
+    if args.prometheus_file:
+        metrics.write_prometheus(args.prometheus_file)
 
     print ('in order to have the js execute, run the html on a local server')
     print ('command in terminal $python -m SimpleHTTPServer')
@@ -0,0 +1,136 @@
+'''
+python 2.7
+
+baseline of the normalized trends: the total number of articles published by
+the NYT in each period (query without search term)
+
+the number of hits of a term is misleading on its own, the NYT did not publish
+the same number of articles every year. The normalized trend is the share of
+all the articles of the period: hits of the term / total of the period.
+
+the totals do not depend on the search term, they are kept in a SQLite file
+(one row per date window) shared by all the queries and users of the file: a
+total is requested from the API once, then read from the file. A total is
+requested again only if the window was not over when it was stored.
+'''
+
+import time
+import sqlite3
+import datetime
+
+from NYT_windows import period_windows, period_label, to_date
+
+
+class BaselineStore(object):
+    '''
+    usage:
+        baseline = BaselineStore('nyt_baseline.sqlite')
+        totals = baseline_totals(2010, 2016, 'year', baseline, planner)
+        shares = normalize(dict_hits, totals)
+    '''
+
+    def __init__(self, path='nyt_baseline.sqlite'):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS totals (
+                                begin_date TEXT NOT NULL,
+                                end_date TEXT NOT NULL,
+                                hits INTEGER NOT NULL,
+                                complete INTEGER NOT NULL,
+                                updated REAL NOT NULL,
+                                PRIMARY KEY (begin_date, end_date))''')
+        self._conn.commit()
+
+    def get(self, window):
+        '''
+        parameters
+        ----------
+        window: as TUPLE (begin_date, end_date), 'YYYYMMDD'
+
+        returns
+        -------
+        INT, the total of the window, None if missing or stale
+        '''
+        row = self._conn.execute('SELECT hits, complete FROM totals '
+                                 'WHERE begin_date = ? AND end_date = ?',
+                                 tuple(window)).fetchone()
+        if row is None or not row[1]:
+            return None
+        return row[0]
+
+    def save(self, window, hits):
+        '''stores the total of a window (complete if the window is over)'''
+        complete = to_date(window[1]) < datetime.date.today()
+        self._conn.execute('INSERT OR REPLACE INTO totals VALUES (?, ?, ?, ?, ?)',
+                           tuple(window) + (hits, int(complete), time.time()))
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+def baseline_totals(start_year, end_year, granularity='year', store=None,
+                    planner=None):
+    '''
+    parameters
+    ----------
+    start_year: as INT
+            first year of the time range
+    end_year: as INT
+            last year of the time range (year included)
+    granularity: as STR, defaults to 'year'
+            'year', 'quarter', 'month' or 'week' (see NYT_windows.py)
+    store: as BaselineStore, optional
+            totals already known, a new one is opened if not given
+    planner: as TrendPlanner, optional
+            sends the requests for the totals missing from the store (one
+            request per period, page 0 without search term), ValueError is
+            raised if a total is missing and no planner is given
+
+    returns
+    -------
+    dictionnary where keys are the periods, values are the total number of
+    articles of the period
+    '''
+    if store is None:
+        store = BaselineStore()
+    list_periods = period_windows(start_year, end_year, granularity)
+
+    totals = {}
+    missing = []
+    for period, window in list_periods:
+        total = store.get(window)
+        if total is None:
+            missing.append((period, window))
+        else:
+            totals[period] = total
+
+    if missing and planner is None:
+        raise ValueError('no planner to request the total of articles of {}'\
+                         .format(', '.join(period_label(period, granularity)
+                                           for period, window in missing)))
+    if missing:
+        planner.fetch([('',) + window + (0,) for period, window in missing],
+                      'baseline', count_naive=False)
+        for period, window in missing:
+            totals[period] = planner.hits('', window)
+            store.save(window, totals[period])
+    return totals
+
+
+def normalize(dict_hits, dict_totals):
+    '''
+    parameters
+    ----------
+    dict_hits: as DICT, keys are the periods, values the hits of a term
+    dict_totals: as DICT, keys are the periods, values the totals (see
+                 baseline_totals)
+
+    returns
+    -------
+    dictionnary where keys are the periods, values are the share of all the
+    articles of the period (FLOAT between 0 and 1)
+    '''
+    return dict((period, float(hits) / dict_totals[period]
+                         if dict_totals.get(period) else 0.)
+                for period, hits in dict_hits.items())
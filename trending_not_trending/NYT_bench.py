@@ -0,0 +1,212 @@
+'''
+python 2.7
+
+benchmark of the fetch layer against the local mock of the API (see
+NYT_mock_server.py): find_trend, get_all_NYT_data and wraper_function_data are
+run with a new client (no cache) and the following is reported for each one
+- wall time (best of the repeats)
+- requests answered by the server, and requests per second
+- bytes sent by the server, and status codes (429 when throttled)
+
+the results can be saved as JSON and compared to a baseline: the script exits
+with an error if a function got slower than the tolerance allows, so that
+changes to the fetch layer can be gated on it
+
+usage:
+    $ python NYT_bench.py --latency 0.05 --save bench.json
+    $ python NYT_bench.py --latency 0.05 --baseline bench.json
+'''
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+
+import argparse #for command line
+
+from NYT_api import find_trend
+from NYT_api_advanced import get_all_NYT_data, wraper_function_data
+from NYT_client import NYTClient, DOC_FIELDS
+from NYT_fetch import RateLimiter
+from NYT_mock_server import MockNYTServer, FixtureStore
+
+
+def write_mock_credentials(directory, num_keys=1):
+    '''credentials file with dummy API keys (only told apart by the mock)'''
+    path = os.path.join(directory, 'credentials.yml')
+    with open(path, 'w') as f:
+        f.write('NYT_api_keys:\n')
+        for i in range(num_keys):
+            f.write('  - mock-key-{}\n'.format(i))
+    return path
+
+
+def scenarios(search_term, start_year, end_year):
+    '''
+    returns
+    -------
+    list of (name, function of the client) to benchmark
+    '''
+    return [
+        ('find_trend',
+         lambda client: find_trend(start_year, end_year, search_term,
+                                   client=client)),
+        ('get_all_NYT_data',
+         lambda client: get_all_NYT_data(search_term, start_year, end_year,
+                                         verbose=False, client=client)),
+        ('wraper_function_data',
+         lambda client: wraper_function_data(start_year, end_year,
+                                             search_term, client=client)),
+    ]
+
+
+def run_benchmark(server, path_to_credentials, search_term='Data Science',
+                  start_year=2010, end_year=2016, repeat=3, api_limits=False,
+                  max_workers=5):
+    '''
+    parameters
+    ----------
+    server: as MockNYTServer, already started
+    path_to_credentials: as STR
+    search_term, start_year, end_year: the query of the benchmark
+    repeat: as INT, defaults to 3
+            number of runs of each function, the best wall time is kept
+    api_limits: as BOOL, defaults to False
+            True: the real limits of the API (5 calls per second per key) are
+                  applied by the client, the time is then mostly spent waiting
+            False: the client is only limited by max_workers
+    max_workers: as INT, defaults to 5
+            number of requests in flight
+
+    returns
+    -------
+    DICT, keys are the names of the functions, values are DICT with
+    'wall_time', 'requests', 'requests_per_second', 'bytes', 'status'
+    '''
+    results = {}
+    for name, func in scenarios(search_term, start_year, end_year):
+        best = None
+        for i in range(repeat):
+            if api_limits:
+                rate_limiter = None
+            else:
+                rate_limiter = RateLimiter(calls_per_second=1e6,
+                                           calls_per_day=10**9,
+                                           max_in_flight=max_workers)
+            client = NYTClient(path_to_credentials, rate_limiter=rate_limiter,
+                               fields=DOC_FIELDS, url=server.url, backoff=0.1)
+            server.reset_stats()
+            start = time.time()
+            func(client)
+            wall_time = time.time() - start
+            client.close()
+            if best is None or wall_time < best['wall_time']:
+                stats = dict(server.stats)
+                best = {'wall_time': wall_time,
+                        'requests': stats['requests'],
+                        'requests_per_second': stats['requests'] / wall_time
+                                               if wall_time else 0.,
+                        'bytes': stats['bytes'],
+                        'status': stats['status']}
+        results[name] = best
+    return results
+
+
+def report(results):
+    '''
+    returns
+    -------
+    STR, one line per function
+    '''
+    lines = ['{:<22}{:>10}{:>10}{:>10}{:>12}  {}'.format('function', 'wall (s)',
+                                                       'requests', 'req/s',
+                                                       'kB', 'status')]
+    for name in sorted(results):
+        r = results[name]
+        lines.append('{:<22}{:>10.3f}{:>10}{:>10.1f}{:>12.1f}  {}'.format(name,
+                     r['wall_time'], r['requests'], r['requests_per_second'],
+                     r['bytes'] / 1024., json.dumps(r['status'],
+                                                    sort_keys=True)))
+    return '\n'.join(lines)
+
+
+def compare(results, baseline, tolerance=0.1):
+    '''
+    parameters
+    ----------
+    results, baseline: as DICT, outputs of run_benchmark
+    tolerance: as FLOAT, defaults to 0.1
+            allowed increase of the wall time (10%)
+
+    returns
+    -------
+    list of STR, the regressions found (empty if none)
+    '''
+    regressions = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        before = baseline[name]['wall_time']
+        after = results[name]['wall_time']
+        if after > before * (1 + tolerance):
+            regressions.append('{}: {:.3f}s instead of {:.3f}s (+{:.0%})'\
+                               .format(name, after, before, after / before - 1))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of the fetch layer '
+                                                 'against a local mock API')
+    parser.add_argument('--term', dest='search_term', type=str,
+                        default='Data Science')
+    parser.add_argument('--start-year', dest='start_year', type=int,
+                        default=2010)
+    parser.add_argument('--end-year', dest='end_year', type=int, default=2016)
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='average answer time of the mock server (s)')
+    parser.add_argument('--rate', dest='calls_per_second', type=float,
+                        help='the mock server answers 429 above this rate')
+    parser.add_argument('--recorded', type=str,
+                        help='ResponseCache file with recorded responses')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', dest='max_workers', type=int, default=5)
+    parser.add_argument('--api-limits', dest='api_limits', action='store_true',
+                        help='apply the real limits of the API in the client')
+    parser.add_argument('--keys', dest='num_keys', type=int, default=1,
+                        help='number of (mock) API keys used by the client')
+    parser.add_argument('--save', type=str,
+                        help='write the results to this JSON file')
+    parser.add_argument('--baseline', type=str,
+                        help='JSON file of a previous run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='allowed slowdown compared to the baseline')
+    args = parser.parse_args()
+
+    server = MockNYTServer(fixtures=FixtureStore(args.recorded),
+                           latency=args.latency,
+                           calls_per_second=args.calls_per_second).start()
+    directory = tempfile.mkdtemp()
+    try:
+        results = run_benchmark(server, write_mock_credentials(directory,
+                                                               args.num_keys),
+                                args.search_term, args.start_year,
+                                args.end_year, repeat=args.repeat,
+                                api_limits=args.api_limits,
+                                max_workers=args.max_workers)
+    finally:
+        server.stop()
+        shutil.rmtree(directory)
+
+    print (report(results))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print ('slower: ' + regression)
+        if regressions:
+            sys.exit(1)
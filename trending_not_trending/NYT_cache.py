@@ -0,0 +1,236 @@
+'''
+python 2.7
+
+persistent on-disk cache for the responses of the NYT Article Search API,
+stored in a single SQLite file
+
+- the key is built from the search parameters (query, begin_date, end_date,
+  page, fields...), the API key is left out so that the cache can be shared
+- responses for a closed year (end_date before the current year) never expire,
+  the results can not change anymore
+- responses touching the current year expire after current_ttl seconds
+- the file is capped to max_size_mb, the least recently used responses are
+  evicted first. The access times of the responses read are kept in memory
+  and written in one transaction (every ACCESS_BATCH reads, before an
+  eviction and when the cache is closed), a read does not commit
+- single flight: several threads or processes (jobs run at the same time)
+  asking for the same response are coalesced, only one of them sends the
+  request and the others wait and read the response from the cache. The
+  processes are synchronized with file locks (flock) on the lock files of the
+  directory next to the cache (path + '.locks')
+'''
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import datetime
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # not available on Windows: the requests are only coalesced between the
+    # threads of a process
+    fcntl = None
+
+# number of lock files, the keys are spread over them
+LOCK_STRIPES = 256
+
+# number of access times kept in memory before they are written
+ACCESS_BATCH = 1000
+
+
+class ResponseCache(object):
+    '''
+    usage:
+        cache = ResponseCache('nyt_cache.sqlite')
+        text = cache.get(search_params)
+        if text is None:
+            with cache.single_flight(search_params):
+                text = cache.get(search_params)
+                if text is None:
+                    r = requests.get(NYT_request_url, params=search_params)
+                    cache.set(search_params, r.text)
+    '''
+
+    def __init__(self, path='nyt_cache.sqlite', max_size_mb=200,
+                 current_ttl=3600):
+        '''
+        parameters
+        ----------
+        path: as STR, defaults to 'nyt_cache.sqlite'
+              path to the SQLite file (created if it does not exist)
+        max_size_mb: as FLOAT, defaults to 200
+              size cap for the stored responses
+        current_ttl: as INT, defaults to 3600
+              time to live in seconds of the responses for the current year
+        '''
+        self.path = path
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.current_ttl = current_ttl
+        self._accessed = {}     # key -> time of the last read, not written
+        self._lock = threading.Lock()
+        self._stripe_locks = {}
+        self._lock_files = {}
+        self.lock_dir = path + '.locks'
+        if fcntl is not None and not os.path.isdir(self.lock_dir):
+            try:
+                os.makedirs(self.lock_dir)
+            except OSError:
+                # created by another process in the meantime
+                pass
+        # timeout: other processes may be writing to the file
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS responses (
+                                    key TEXT PRIMARY KEY,
+                                    body TEXT NOT NULL,
+                                    size INTEGER NOT NULL,
+                                    created REAL NOT NULL,
+                                    accessed REAL NOT NULL,
+                                    expires REAL)''')
+            self._conn.execute('''CREATE INDEX IF NOT EXISTS idx_accessed
+                                  ON responses (accessed)''')
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(search_params):
+        '''
+        parameters
+        ----------
+        search_params: as DICT
+                       the parameters of the GET request
+
+        returns
+        -------
+        STR, the parameters (without the API key) serialized in a stable order
+        '''
+        params = dict((k, str(v)) for k, v in search_params.items()
+                      if k != 'api-key')
+        return json.dumps(params, sort_keys=True)
+
+    def expires_at(self, search_params, now=None):
+        '''
+        returns
+        -------
+        FLOAT, the time at which the response expires
+        None if the response covers a closed year and never expires
+        '''
+        now = time.time() if now is None else now
+        end_date = str(search_params.get('end_date', ''))
+        current_year = datetime.date.today().year
+        if end_date[:4].isdigit() and int(end_date[:4]) < current_year:
+            return None
+        return now + self.current_ttl
+
+    def get(self, search_params):
+        '''
+        returns
+        -------
+        the text of the stored response as STR, None if missing or expired
+        '''
+        key = self.make_key(search_params)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute('SELECT body, expires FROM responses '
+                                     'WHERE key = ?', (key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] < now):
+                if row is not None:
+                    self._conn.execute('DELETE FROM responses WHERE key = ?',
+                                       (key,))
+                    self._conn.commit()
+                return None
+            self._accessed[key] = now
+            if len(self._accessed) >= ACCESS_BATCH:
+                self._write_accessed()
+                self._conn.commit()
+            return row[0]
+
+    def set(self, search_params, text):
+        '''stores the text of a response, then evicts if over the size cap'''
+        key = self.make_key(search_params)
+        now = time.time()
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO responses '
+                               'VALUES (?, ?, ?, ?, ?, ?)',
+                               (key, text, len(text), now, now,
+                                self.expires_at(search_params, now)))
+            self._evict()
+            self._conn.commit()
+
+    def _write_accessed(self):
+        '''writes the access times kept in memory (not committed)'''
+        if self._accessed:
+            self._conn.executemany('UPDATE responses SET accessed = ? '
+                                   'WHERE key = ?',
+                                   [(t, key) for key, t
+                                    in self._accessed.items()])
+            self._accessed = {}
+
+    def _evict(self):
+        '''deletes the least recently used responses until under the size cap'''
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) '
+                                   'FROM responses').fetchone()[0]
+        if total <= self.max_size:
+            return
+        self._write_accessed()
+        rows = self._conn.execute('SELECT key, size FROM responses '
+                                  'ORDER BY accessed ASC').fetchall()
+        to_delete = []
+        for key, size in rows:
+            if total <= self.max_size:
+                break
+            to_delete.append((key,))
+            total -= size
+        self._conn.executemany('DELETE FROM responses WHERE key = ?',
+                               to_delete)
+
+    @contextmanager
+    def single_flight(self, search_params):
+        '''
+        exclusive lock on the key of search_params, held by one thread of one
+        process at a time (two keys may share a lock, rarely)
+        '''
+        digest = hashlib.sha1(self.make_key(search_params).encode('utf-8'))
+        stripe = int(digest.hexdigest()[:8], 16) % LOCK_STRIPES
+        with self._lock:
+            thread_lock = self._stripe_locks.setdefault(stripe,
+                                                        threading.Lock())
+        with thread_lock:
+            if fcntl is None:
+                yield
+                return
+            lock_file = self._lock_files.get(stripe)
+            if lock_file is None:
+                lock_file = open(os.path.join(self.lock_dir,
+                                              '{:03d}.lock'.format(stripe)),
+                                 'a+b')
+                self._lock_files[stripe] = lock_file
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def clear(self):
+        with self._lock:
+            self._accessed = {}
+            self._conn.execute('DELETE FROM responses')
+            self._conn.commit()
+
+    def flush(self):
+        '''writes the access times of the responses read since the last write'''
+        with self._lock:
+            self._write_accessed()
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._write_accessed()
+            self._conn.commit()
+            self._conn.close()
+            for lock_file in self._lock_files.values():
+                lock_file.close()
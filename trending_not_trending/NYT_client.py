@@ -0,0 +1,347 @@
+'''
+python 2.7
+
+client for the NYT Article Search API, shared by NYT_api.py, NYT_api_advanced.py
+and the planner
+
+- the credentials file is read once, when the client is created, it can hold
+  several API keys: the requests are spread over the keys (see KeyPool in
+  NYT_fetch.py)
+- the requests go through a requests.Session: the TCP connections are kept
+  alive and reused (connection pool) instead of opening one per request
+- the responses are looked up in the HarvestJournal of the job in progress
+  (see NYT_journal.py), then in the ResponseCache (see NYT_cache.py), the
+  requests for a same response are coalesced between threads and processes
+- the RateLimiter (see NYT_fetch.py) is only used for the requests actually sent
+- throttled (429) and server errors (5xx) are retried with an exponential
+  backoff and some random jitter
+- only the fields needed by the scripts can be asked for (field list 'fl'),
+  the responses are sent compressed (gzip) and decoded with the fastest JSON
+  parser installed (orjson, ujson, simplejson, or json)
+- the latency, status code, retries, size, parse time and cache hit/miss of
+  each request are recorded in a FetchMetrics (see NYT_metrics.py)
+'''
+
+import time
+import random
+
+try:
+    import orjson as fast_json
+except ImportError:
+    try:
+        import ujson as fast_json
+    except ImportError:
+        try:
+            import simplejson as fast_json
+        except ImportError:
+            import json as fast_json
+
+import yaml
+import requests
+from requests.adapters import HTTPAdapter
+
+from NYT_fetch import KeyPool
+from NYT_metrics import FetchMetrics
+
+NYT_REQUEST_URL = "http://api.nytimes.com/svc/search/v2/articlesearch.json"
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+# the only fields of the documents used by the scripts (meta.hits is always
+# in the response)
+DOC_FIELDS = ('_id', 'pub_date', 'keywords')
+
+# for the jobs that only need the number of hits (NYT_api.py): the smallest
+# field, the 10 documents of the page are sent back almost empty
+HITS_FIELDS = ('_id',)
+
+
+def loads(raw):
+    '''
+    parameters
+    ----------
+    raw: the body of a response as bytes (r.content) or STR (r.text)
+
+    returns
+    -------
+    the .json converted to a dictionary
+    '''
+    if fast_json.__name__ == 'json' and isinstance(raw, bytes):
+        raw = raw.decode('utf-8')
+    return fast_json.loads(raw)
+
+
+def read_api_keys(path_to_credentials):
+    '''
+    parameters
+    ----------
+    path_to_credentials: as STR
+            path to the .yml file with the API key(s), either
+                NYT_api_key: key
+            or a list of keys
+                NYT_api_keys:
+                  - key_1
+                  - key_2
+
+    returns
+    -------
+    LIST of STR, the API keys
+    '''
+    with open(path_to_credentials) as f:
+        credentials = yaml.safe_load(f)
+    keys = credentials.get('NYT_api_keys') or credentials['NYT_api_key']
+    if not isinstance(keys, list):
+        keys = [keys]
+    return [str(key) for key in keys]
+
+
+class CachedResponse(object):
+    '''
+    stand-in for the requests response object when the text comes from the
+    cache (only the attributes used in the scripts are provided)
+    '''
+
+    def __init__(self, url, text):
+        self.url = url
+        self.text = text
+        self.content = text.encode('utf-8')
+        self.status_code = 200
+        self.from_cache = True
+
+
+class NYTClient(object):
+    '''
+    usage:
+        client = NYTClient('../../credentials/credentials.yml', cache=cache)
+        data = client.get_json(client.search_params('Donald Trump',
+                                                    '20150101', '20151231'))
+    '''
+
+    def __init__(self, path_to_credentials='../../credentials/credentials.yml',
+                 cache=None, rate_limiter=None, pool_size=10, max_retries=5,
+                 backoff=1., timeout=30, fields=None, url=NYT_REQUEST_URL,
+                 metrics=None, journal=None, key_pool=None, quota_store=None):
+        '''
+        parameters
+        ----------
+        path_to_credentials: as STR
+                path to the .yml file with the API key stored in the following
+                format: NYT_api_key: + space + NYT issued code
+                (or a list of keys, see read_api_keys)
+        cache: as ResponseCache, optional
+                on-disk cache of the responses
+        rate_limiter: as RateLimiter, optional
+                token bucket shared by all the keys, each key has its own
+                budget (5 calls per second, 1000 per day) if not given
+        pool_size: as INT, defaults to 10
+                number of connections kept alive
+        max_retries: as INT, defaults to 5
+                number of retries for a throttled request or a server error
+        backoff: as FLOAT, defaults to 1.
+                wait in seconds before the first retry, doubled at each retry
+        timeout: as FLOAT, defaults to 30
+                seconds to wait for an answer of the server
+        fields: as LIST of STR, optional
+                fields of the documents to ask for (e.g. DOC_FIELDS), all the
+                fields are sent back if not given
+        url: as STR, defaults to NYT_REQUEST_URL
+                endpoint of the API (e.g. the url of a MockNYTServer, see
+                NYT_mock_server.py)
+        metrics: as FetchMetrics, optional
+                metrics of the requests, a new one is created if not given
+        journal: as HarvestJournal, optional
+                units of the job already done, each response sent by the API
+                is recorded in it (to resume the job after a crash), only as a
+                mark if the response is kept in the cache
+        key_pool: as KeyPool, optional
+                keys to use with their budgets, made from the keys of the
+                credentials file (and rate_limiter) if not given
+        quota_store: as QuotaStore, optional
+                calls sent today with each key, by this run and the others,
+                for the budgets made here (the daily quota is only counted from
+                the start of the process if not given)
+        '''
+        ########    authentification (once for all the requests)
+        self.api_keys = read_api_keys(path_to_credentials)
+        self.NYT_api_key = self.api_keys[0]
+        if key_pool is None:
+            if rate_limiter is not None:
+                key_pool = KeyPool(self.api_keys,
+                                   limiters=[rate_limiter] * len(self.api_keys),
+                                   max_in_flight=rate_limiter.max_in_flight)
+            else:
+                key_pool = KeyPool(self.api_keys, store=quota_store)
+        self.keys = key_pool
+
+        self.url = url
+        self.cache = cache
+        self.journal = journal
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.fields = fields
+
+        ########    metrics of the requests (latency, retries, bytes...)
+        self.metrics = metrics if metrics is not None else FetchMetrics()
+
+        ########    connection pool
+        self.session = requests.Session()
+        self.session.headers['Accept-Encoding'] = 'gzip'
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def search_params(self, search_term, begin_date, end_date, page=0):
+        '''
+        parameters
+        ----------
+        search_term: as STR
+                an empty STR queries all the articles of the dates (see
+                NYT_baseline.py)
+        begin_date, end_date: as STR, formatted as 'YYYYMMDD'
+        page: as INT, defaults to 0
+
+        returns
+        -------
+        DICT, the parameters of the GET request (without the API key)
+        '''
+        search_params = {'begin_date': begin_date,
+                         'end_date': end_date,
+                         'page': page}
+        if search_term:
+            search_params['q'] = search_term
+        if self.fields:
+            search_params['fl'] = ','.join(self.fields)
+        return search_params
+
+    def _retry_wait(self, attempt, r=None):
+        '''exponential backoff with jitter, Retry-After is used if given'''
+        retry_after = r.headers.get('Retry-After') if r is not None else None
+        if retry_after is not None and retry_after.isdigit():
+            wait = float(retry_after)
+        else:
+            wait = self.backoff * 2 ** attempt
+        return wait + random.uniform(0, self.backoff)
+
+    def _send(self, search_params):
+        '''
+        sends the GET request, with retries: a throttled key (429) cools down
+        and the request is sent again at once with another key if there is one
+        '''
+        params = dict(search_params)
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            if attempt > 0:
+                self.metrics.record_retry()
+            try:
+                with self.keys.use() as key:
+                    params['api-key'] = key
+                    start = time.time()
+                    r = self.session.get(self.url, params=params,
+                                         timeout=self.timeout)
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout):
+                self.metrics.record_attempt(time.time() - start)
+                if last_attempt:
+                    raise
+                time.sleep(self._retry_wait(attempt))
+                continue
+            self.metrics.record_attempt(time.time() - start, r.status_code)
+            if r.status_code == 429:
+                self.keys.throttled(key, self._retry_wait(attempt, r))
+            if r.status_code not in RETRY_STATUS or last_attempt:
+                break
+            if r.status_code != 429:
+                time.sleep(self._retry_wait(attempt, r))
+        r.raise_for_status()
+
+        decoded = len(r.content)
+        wire = int(r.headers.get('Content-Length', decoded))
+        self.metrics.record_response(decoded, wire)
+        return r
+
+    def get(self, search_params):
+        '''
+        parameters
+        ----------
+        search_params: as DICT
+                parameters of the GET request (the API key is added)
+
+        returns
+        -------
+        r: a request object (or a CachedResponse)
+        '''
+        search_params = dict((k, v) for k, v in search_params.items()
+                             if k != 'api-key')
+        done = False
+        if self.journal is not None:
+            text = self.journal.get(search_params)
+            if text:
+                return CachedResponse(self.url, text)
+            # '': the unit is done and its response is in the cache
+            done = text is not None
+
+        sent = False
+        if self.cache is None:
+            r = self._send(search_params)
+            sent = True
+        else:
+            text = self.cache.get(search_params)
+            if text is None:
+                # single flight: the threads and processes asking for the same
+                # response wait for the first one and read it from the cache
+                with self.cache.single_flight(search_params):
+                    text = self.cache.get(search_params)
+                    if text is None:
+                        r = self._send(search_params)
+                        sent = True
+                        self.cache.set(search_params, r.text)
+            self.metrics.record_cache(text is not None)
+            if text is not None:
+                r = CachedResponse(self.url, text)
+
+        # only the responses sent are new units, the body is kept once
+        if self.journal is not None and sent and not done:
+            self.journal.record(search_params,
+                                r.text if self.cache is None else '')
+        return r
+
+    def get_json(self, search_params):
+        '''
+        returns
+        -------
+        the response to the GET request, converted to a dictionary
+        '''
+        return self.decode(self.get(search_params))
+
+    def decode(self, r):
+        '''
+        parameters
+        ----------
+        r: a request object (or a CachedResponse)
+
+        returns
+        -------
+        the .json converted to a dictionary (the parse time is recorded)
+        '''
+        start = time.time()
+        data = loads(r.content)
+        self.metrics.record_parse(time.time() - start)
+        return data
+
+    def bytes_report(self):
+        '''
+        returns
+        -------
+        STR, number of responses received and their average size
+        '''
+        n = self.metrics.responses
+        decoded = self.metrics.decoded_bytes
+        wire = self.metrics.wire_bytes
+        if n == 0:
+            return 'no response received from the API'
+        return '{} responses, {:.1f} kB per response ({:.1f} kB compressed)'\
+               .format(n, decoded / 1024. / n, wire / 1024. / n)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,225 @@
+'''
+python 2.7
+
+graph of the keywords found together in the articles of a search term, per
+year (or period)
+
+the articles of a period are the rows of a sparse binary matrix X (article x
+keyword, 1 if the keyword is given for the article). The co-occurrence of two
+keywords, the number of articles having both, is then the matrix product
+X.T * X, computed by scipy.sparse without looping over the pairs of keywords
+of each article:
+- only the ids of the keywords of each article are kept while the pages
+  arrive (two arrays of 32-bit INT per period)
+- the product is limited to the most frequent keywords of the period
+- each keyword keeps its k strongest edges, selected with a sort of the
+  non-zero entries
+
+the graph of a period is exported as a compact DICT (list of keywords, and
+edges as [i, j, count] with i and j indices in the list), e.g. for the
+dashboard
+'''
+
+import json
+from array import array
+
+import numpy as np
+from scipy import sparse
+
+from NYT_windows import period_key
+
+
+class CooccurrenceGraph(object):
+    '''
+    usage:
+        graph = CooccurrenceGraph()
+        for doc in docs:
+            year, list_keywords = extract_info(doc)
+            graph.add(year, list_keywords)
+        graph.top_edges(2016, k=5)  # [(keyword, keyword, count), ...]
+        graph.graph(2016)           # {'keywords': ..., 'edges': ...}
+    '''
+
+    def __init__(self):
+        self.vocabulary = {}    # keyword -> id
+        self.words = []         # id -> keyword
+        self._rows = {}         # period -> array of the article indices
+        self._cols = {}         # period -> array of the keyword ids
+        self._articles = {}     # period -> number of articles
+
+    def intern(self, keyword):
+        '''
+        returns
+        -------
+        INT, the id of the keyword (a new id if it was never seen)
+        '''
+        i = self.vocabulary.get(keyword)
+        if i is None:
+            i = len(self.words)
+            self.vocabulary[keyword] = i
+            self.words.append(keyword)
+        return i
+
+    ########    adding articles
+
+    def add(self, period, keywords):
+        '''adds an article (its LIST of keywords, as STR) to the period'''
+        if period not in self._articles:
+            self._rows[period] = array('i')
+            self._cols[period] = array('i')
+            self._articles[period] = 0
+        ids = set(self.intern(keyword) for keyword in keywords)
+        self._rows[period].extend([self._articles[period]] * len(ids))
+        self._cols[period].extend(ids)
+        self._articles[period] += 1
+
+    ########    lookups
+
+    def periods(self):
+        '''LIST of the periods with articles, sorted'''
+        return sorted(self._articles)
+
+    def articles(self, period):
+        '''number of articles of the period'''
+        return self._articles.get(period, 0)
+
+    def matrix(self, period):
+        '''
+        returns
+        -------
+        sparse CSC matrix (articles x keywords) of the period, 1 if the
+        keyword is given for the article
+        '''
+        rows = np.frombuffer(self._rows[period], dtype=np.intc)
+        cols = np.frombuffer(self._cols[period], dtype=np.intc)
+        return sparse.csc_matrix((np.ones(len(rows), dtype=np.int32),
+                                  (rows, cols)),
+                                 shape=(self._articles[period],
+                                        len(self.words)))
+
+    def cooccurrence(self, period, max_keywords=200):
+        '''
+        parameters
+        ----------
+        period: key of the period
+        max_keywords: as INT, defaults to 200
+                only the most frequent keywords of the period are kept (all
+                of them if None)
+
+        returns
+        -------
+        (ids, counts, C)
+        ids: NumPy array of the ids of the keywords kept, the most frequent
+             first
+        counts: NumPy array, number of articles of each keyword
+        C: sparse COO matrix, C[a, b] is the number of articles with both
+           keywords ids[a] and ids[b] (a != b, the diagonal is dropped)
+        '''
+        X = self.matrix(period)
+        freq = np.asarray(X.sum(axis=0)).ravel()
+        ids = np.flatnonzero(freq)
+        ids = ids[np.argsort(-freq[ids], kind='mergesort')]
+        if max_keywords is not None:
+            ids = ids[:max_keywords]
+        X = X[:, ids]
+        C = X.T.dot(X).tocoo()
+        off = C.row != C.col
+        C = sparse.coo_matrix((C.data[off], (C.row[off], C.col[off])),
+                              shape=C.shape)
+        return ids, freq[ids], C
+
+    def _edges(self, period, k, max_keywords, min_count):
+        '''ids, counts, and the edges (a, b, count) with a < b as arrays'''
+        ids, counts, C = self.cooccurrence(period, max_keywords)
+        keep = C.data >= min_count
+        a, b, w = C.row[keep], C.col[keep], C.data[keep]
+        # the k strongest edges of each keyword: sort by keyword, then by
+        # decreasing count, the rank of an edge is its position in its block
+        order = np.lexsort((-w, a))
+        a, b, w = a[order], b[order], w[order]
+        rank = np.arange(len(a)) - np.searchsorted(a, a, side='left')
+        top = rank < k
+        a, b, w = a[top], b[top], w[top]
+        # an edge kept by both of its keywords is given once
+        low, high = np.minimum(a, b), np.maximum(a, b)
+        pairs, first = np.unique(low.astype(np.int64) * len(ids) + high,
+                                 return_index=True)
+        low, high, w = low[first], high[first], w[first]
+        order = np.lexsort((high, low, -w))
+        return ids, counts, low[order], high[order], w[order]
+
+    def top_edges(self, period, k=5, max_keywords=200, min_count=1):
+        '''
+        parameters
+        ----------
+        period: key of the period
+        k: as INT, defaults to 5
+                number of edges kept per keyword, the strongest
+        max_keywords: as INT, defaults to 200
+                see cooccurrence
+        min_count: as INT, defaults to 1
+                edges of fewer articles are dropped
+
+        returns
+        -------
+        LIST of (keyword, keyword, number of articles with both), the
+        strongest first
+        '''
+        ids, counts, low, high, w = self._edges(period, k, max_keywords,
+                                                min_count)
+        return [(self.words[ids[a]], self.words[ids[b]], int(c))
+                for a, b, c in zip(low, high, w)]
+
+    def graph(self, period, k=5, max_keywords=200, min_count=1):
+        '''
+        see top_edges for the parameters
+
+        returns
+        -------
+        DICT with
+        'articles': number of articles of the period
+        'keywords': LIST of the keywords with an edge, the most frequent first
+        'counts': LIST of the number of articles of each keyword
+        'edges': LIST of [i, j, count], i and j indices in 'keywords'
+        '''
+        ids, counts, low, high, w = self._edges(period, k, max_keywords,
+                                                min_count)
+        used = np.union1d(low, high)
+        index = np.zeros(len(ids), dtype=np.int64)
+        index[used] = np.arange(len(used))
+        return {'articles': self._articles[period],
+                'keywords': [self.words[ids[a]] for a in used],
+                'counts': [int(counts[a]) for a in used],
+                'edges': [[int(index[a]), int(index[b]), int(c)]
+                          for a, b, c in zip(low, high, w)]}
+
+    def to_dict(self, granularity='year', **kwargs):
+        '''
+        returns
+        -------
+        DICT, keys are the keys of the periods (see NYT_windows.period_key),
+        values are their graph (see graph for the keyword arguments)
+        '''
+        return dict((period_key(period, granularity),
+                     self.graph(period, **kwargs))
+                    for period in self.periods())
+
+
+def write_graphs(d_graphs, filename='graph.json', granularity='year',
+                 **kwargs):
+    '''
+    writes the graphs of several terms to a JSON file
+    {search term: {period key: graph}} (see CooccurrenceGraph.to_dict)
+
+    parameters
+    ----------
+    d_graphs: as DICT, keys are the search terms, values their
+              CooccurrenceGraph
+    filename: as STR, defaults to 'graph.json'
+    granularity: as STR, defaults to 'year'
+    '''
+    content = dict((term, graph.to_dict(granularity, **kwargs))
+                   for term, graph in d_graphs.items())
+    with open(filename, 'w') as f:
+        json.dump(content, f, separators=(',', ':'), sort_keys=True)
+    return content
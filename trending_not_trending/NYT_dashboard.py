@@ -0,0 +1,282 @@
+'''
+python 2.7
+
+offline version of the dashboard: no request to plot.ly, and no image inlined
+in the page
+
+- the bar chart is drawn in the page as SVG, made here from the hits (a few
+  hundred bytes per bar, no Javascript library to download)
+- each wordcloud is a separate file in 'wordclouds/', named by the hash of
+  its content: the browser only downloads the image of a bar when the mouse
+  goes over it, and keeps it in its cache (a new image gets a new name)
+- the images are served with the type of their format (PNG or WebP)
+
+the page is shown as soon as the HTML is read, whatever the number of
+periods: the images are not part of it
+
+usage:
+    images = render_wordclouds({(0, 2010): frequencies, ...})
+    write_offline_dashboard(2010, 2016, {'Donald Trump': dict_hits}, images)
+    $ python -m SimpleHTTPServer    (or open index.html)
+'''
+
+import os
+import math
+import hashlib
+from xml.sax.saxutils import escape, quoteattr
+
+from NYT_windows import period_windows, period_label
+from NYT_render import EXTENSIONS
+
+IMAGE_DIRECTORY = 'wordclouds'
+
+# colors of the traces, as plotly
+COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b',
+          '#e377c2', '#7f7f7f', '#bcbd22', '#17becf']
+
+BLANK_IMAGE = 'data:image/gif;base64,R0lGODlhAQABAAD/ACwAAAAAAQABAAACADs='
+
+
+def write_images(images, directory='.', image_format='png'):
+    '''
+    parameters
+    ----------
+    images: as LIST of (key, image as bytes), e.g. from render_wordclouds
+    directory: as STR, defaults to '.'
+            directory of the dashboard, the images go to its 'wordclouds/'
+    image_format: as STR, defaults to 'png'
+
+    returns
+    -------
+    DICT, keys are the keys of images, values are the paths of the images
+    relative to the directory
+
+    the images of a previous dashboard that are not used anymore are removed
+    '''
+    image_directory = os.path.join(directory, IMAGE_DIRECTORY)
+    if not os.path.isdir(image_directory):
+        os.makedirs(image_directory)
+
+    paths = {}
+    for key, data in images:
+        name = hashlib.sha1(data).hexdigest()[:20] + EXTENSIONS[image_format]
+        filename = os.path.join(image_directory, name)
+        if not os.path.exists(filename):
+            with open(filename + '.tmp', 'wb') as f:
+                f.write(data)
+            os.rename(filename + '.tmp', filename)
+        paths[key] = IMAGE_DIRECTORY + '/' + name
+
+    used = set(os.path.basename(path) for path in paths.values())
+    for name in os.listdir(image_directory):
+        if os.path.splitext(name)[1] in EXTENSIONS.values() \
+                and name not in used:
+            os.remove(os.path.join(image_directory, name))
+    return paths
+
+
+def nice_ticks(max_value, num_ticks=5):
+    '''
+    returns
+    -------
+    LIST of the values of the ticks of the y-axis, from 0 to at least
+    max_value, with a round step (1, 2 or 5 x a power of 10)
+    '''
+    if max_value <= 0:
+        return [0, 1]
+    raw = float(max_value) / num_ticks
+    power = 10 ** math.floor(math.log10(raw))
+    step = next(m * power for m in (1, 2, 5, 10) if m * power >= raw)
+    count = int(math.ceil(max_value / step - 1e-9))
+    return [i * step for i in range(count + 1)]
+
+
+def format_value(value, normalized=False):
+    if normalized:
+        return '{:.2%}'.format(value)
+    return '{:,}'.format(int(value)) if value == int(value) \
+           else '{:,.2f}'.format(value)
+
+
+def svg_bar_chart(start_year, end_year, d_hits, image_paths=None,
+                  granularity='year', normalized=False, width=1000,
+                  height=500):
+    '''
+    grouped bar chart of the hits of the terms, as SVG
+
+    parameters
+    ----------
+    d_hits: as DICT
+            key is the search term, value is the dict_hits for that term (the
+            order of the bars is the order of the sorted terms)
+    image_paths: as DICT, optional
+            keys are (index of the term, period), values are the paths of
+            the wordclouds (see write_images), shown on hover
+    normalized: as BOOL, defaults to False
+            the values of dict_hits are shares of all the articles (see
+            NYT_baseline.py), shown as percentages
+
+    returns
+    -------
+    STR, the <svg> element
+    '''
+    image_paths = image_paths or {}
+    terms = sorted(d_hits)
+    periods = [period for period, window
+               in period_windows(start_year, end_year, granularity)]
+
+    left, right, top, bottom = 80, 20, 40, 90
+    plot_width = width - left - right
+    plot_height = height - top - bottom
+    values = [d_hits[term].get(period, 0) for term in terms
+              for period in periods]
+    ticks = nice_ticks(max(values) if values else 0)
+    y_max = float(ticks[-1])
+
+    def y(value):
+        return top + plot_height * (1 - value / y_max)
+
+    parts = ['<svg id="chart" xmlns="http://www.w3.org/2000/svg" '
+             'viewBox="0 0 {0} {1}" width="{0}" height="{1}">'.format(width,
+                                                                      height)]
+    # y-axis
+    for tick in ticks:
+        parts.append('<line class="grid" x1="{}" x2="{}" y1="{:.1f}" '
+                     'y2="{:.1f}"/>'.format(left, width - right, y(tick),
+                                            y(tick)))
+        parts.append('<text class="tick" x="{}" y="{:.1f}" '
+                     'text-anchor="end">{}</text>'.format(left - 8,
+                     y(tick) + 4, escape(format_value(tick, normalized))))
+
+    # bars, grouped by period
+    group = float(plot_width) / max(len(periods), 1)
+    bar = group * 0.8 / max(len(terms), 1)
+    for p, period in enumerate(periods):
+        label = period_label(period, granularity)
+        x0 = left + group * p + group * 0.1
+        for i, term in enumerate(terms):
+            value = d_hits[term].get(period, 0)
+            attributes = ''
+            if (i, period) in image_paths:
+                attributes = ' data-image={}'.format(
+                                        quoteattr(image_paths[(i, period)]))
+            parts.append('<rect class="bar" x="{:.1f}" y="{:.1f}" '
+                         'width="{:.1f}" height="{:.1f}" fill="{}"{}>'
+                         '<title>{}</title></rect>'.format(x0 + bar * i,
+                         y(value), bar, top + plot_height - y(value),
+                         COLORS[i % len(COLORS)], attributes,
+                         escape('{} - {}: {}'.format(term, label,
+                                format_value(value, normalized)))))
+        x = x0 + group * 0.4
+        parts.append('<text class="label" x="{0:.1f}" y="{1}" '
+                     'text-anchor="end" transform="rotate(-45 {0:.1f} {1})">'
+                     '{2}</text>'.format(x, top + plot_height + 16,
+                                         escape(label)))
+
+    # legend
+    if len(terms) > 1:
+        for i, term in enumerate(terms):
+            x = left + 160 * i
+            parts.append('<rect x="{}" y="10" width="12" height="12" '
+                         'fill="{}"/><text class="legend" x="{}" y="21">{}'
+                         '</text>'.format(x, COLORS[i % len(COLORS)], x + 18,
+                                          escape(term)))
+    parts.append('</svg>')
+    return '\n'.join(parts)
+
+
+def writing_offline_js_file(filename='dashboard.js'):
+    '''
+    writes the Javascript of the offline dashboard: the wordcloud of a bar
+    (its 'data-image' file) is shown when the mouse goes over the bar
+    '''
+    content = '''(function main() {
+
+    var hoverImg = document.getElementById('hover-image');
+    var blankImg = \'''' + BLANK_IMAGE + '''\';
+
+    function onHover(e) {
+        hoverImg.src = e.currentTarget.getAttribute('data-image') || blankImg;
+    }
+
+    var bars = document.querySelectorAll('#chart .bar');
+    for (var i = 0; i < bars.length; i++) {
+        bars[i].addEventListener('mouseenter', onHover);
+    }
+
+    })();
+    '''
+    with open(filename, 'w') as f:
+        f.write(content)
+    return content
+
+
+def writing_offline_html_file(svg, js_file='dashboard.js',
+                              filename='index.html', title='NYT trend'):
+    '''
+    writes the index.html of the offline dashboard, with the chart in the page
+    '''
+    content = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ font-family: sans-serif; }}
+#chart .grid {{ stroke: #e5e5e5; }}
+#chart .tick, #chart .label, #chart .legend {{ font-size: 12px; fill: #444; }}
+#chart .bar:hover {{ opacity: 0.8; }}
+img {{
+  position: absolute;
+  left: 400px;
+  top: 130px;
+  border: none;
+  max-width: 400px;
+  max-height: 300px;
+  pointer-events: none;
+}}
+</style>
+</head>
+<body>
+
+{svg}
+
+<img id="hover-image" src="{blank}" alt="">
+
+<script src="{js_file}"></script>
+
+</body>
+</html>
+'''.format(title=escape(title), svg=svg, blank=BLANK_IMAGE, js_file=js_file)
+    with open(filename, 'w') as f:
+        f.write(content)
+    return content
+
+
+def write_offline_dashboard(start_year, end_year, d_hits, images,
+                            directory='.', granularity='year',
+                            normalized=False, image_format='png'):
+    '''
+    parameters
+    ----------
+    d_hits: as DICT
+            key is the search term, value is the dict_hits for that term
+    images: as LIST of ((index of the term, period), image as bytes), the
+            index being the position of the term in the sorted terms (see
+            render_wordclouds)
+    directory: as STR, defaults to '.'
+            index.html, dashboard.js and wordclouds/ are written there
+    see svg_bar_chart for the other variables
+
+    returns
+    -------
+    STR, path of the index.html
+    '''
+    image_paths = write_images(images, directory, image_format)
+    svg = svg_bar_chart(start_year, end_year, d_hits, image_paths,
+                        granularity, normalized)
+    writing_offline_js_file(os.path.join(directory, 'dashboard.js'))
+    filename = os.path.join(directory, 'index.html')
+    writing_offline_html_file(svg, 'dashboard.js', filename,
+                              title=' vs '.join(sorted(d_hits)))
+    return filename
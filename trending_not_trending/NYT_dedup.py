@@ -0,0 +1,135 @@
+'''
+python 2.7
+
+de-duplication of the articles by their '_id'
+
+the same article can be sent back several times for a search term: the pages
+of the API shift while they are requested, date windows can overlap (e.g. a
+refresh over a range partly stored), the same query can be run twice... Its
+keywords would then be counted several times. The Deduplicator drops the
+repeats before the keywords are regrouped, and reports the duplicate rate.
+
+the ids are kept as 64-bit hashes in a sorted NumPy array (8 bytes per id,
+about 8 MB for a million articles) plus a small buffer of the last ids,
+merged into the array when it is full. Two different ids share a hash with a
+probability of about n^2 / 2^65, negligible for the sizes of a harvest.
+'''
+
+import hashlib
+
+import numpy as np
+
+
+def id_hash(scope, doc_id):
+    '''64-bit hash of the id of an article within a scope (e.g. a search term)'''
+    text = u'{}\x00{}'.format(scope, doc_id)
+    return int(hashlib.md5(text.encode('utf-8')).hexdigest()[:16], 16)
+
+
+class IdSet(object):
+    '''
+    compact set of 64-bit hashes
+
+    usage:
+        ids = IdSet()
+        ids.add(id_hash('Donald Trump', doc['_id']))  # True if new
+    '''
+
+    def __init__(self, buffer_size=65536):
+        '''
+        parameters
+        ----------
+        buffer_size: as INT, defaults to 65536
+                number of hashes kept in a Python set before they are merged
+                in the sorted array
+        '''
+        self._sorted = np.zeros(0, dtype=np.uint64)
+        self._buffer = set()
+        self.buffer_size = buffer_size
+
+    def __len__(self):
+        return len(self._sorted) + len(self._buffer)
+
+    def __contains__(self, h):
+        if h in self._buffer:
+            return True
+        i = np.searchsorted(self._sorted, np.uint64(h))
+        return i < len(self._sorted) and int(self._sorted[i]) == h
+
+    def add(self, h):
+        '''
+        returns
+        -------
+        True if h was not in the set (it is added), False otherwise
+        '''
+        if h in self:
+            return False
+        self._buffer.add(h)
+        if len(self._buffer) >= self.buffer_size:
+            self._merge()
+        return True
+
+    def _merge(self):
+        new = np.fromiter(self._buffer, dtype=np.uint64, count=len(self._buffer))
+        self._sorted = np.union1d(self._sorted, new)
+        self._buffer = set()
+
+    @property
+    def nbytes(self):
+        '''approximate memory used, in bytes'''
+        return self._sorted.nbytes + 64 * len(self._buffer)
+
+
+class Deduplicator(object):
+    '''
+    usage:
+        dedup = Deduplicator()
+        for term, year, docs in planner.stream(terms, 2010, 2016):
+            docs = dedup.filter(term, docs)
+            ...
+        print(dedup.report())
+    '''
+
+    def __init__(self):
+        self.ids = IdSet()
+        self.seen = 0
+        self.duplicates = 0
+
+    def filter(self, scope, docs):
+        '''
+        parameters
+        ----------
+        scope: as STR
+               the articles are de-duplicated within a scope: the search term,
+               an article found by two terms is kept for both
+        docs: as LIST of the documents (DICT)
+
+        returns
+        -------
+        LIST of the documents not seen before in the scope (the documents
+        without '_id' are kept)
+        '''
+        kept = []
+        for doc in docs:
+            self.seen += 1
+            doc_id = doc.get('_id')
+            if doc_id is None or self.ids.add(id_hash(scope, doc_id)):
+                kept.append(doc)
+            else:
+                self.duplicates += 1
+        return kept
+
+    @property
+    def duplicate_rate(self):
+        return float(self.duplicates) / self.seen if self.seen else 0.
+
+    def report(self):
+        '''
+        returns
+        -------
+        STR, number of repeats dropped and memory used by the ids
+        '''
+        return '{} duplicate articles dropped out of {} ({:.1%}), ' \
+               '{:.1f} MB of ids'.format(self.duplicates, self.seen,
+                                         self.duplicate_rate,
+                                         self.ids.nbytes / 1024. / 1024.)
@@ -0,0 +1,469 @@
+'''
+python 2.7
+
+helpers to send the GET requests to the NYT API concurrently, while staying
+within the rate limits of the Article Search API (5 calls per second and
+1K calls per day, see Follow_Along.md)
+
+- RateLimiter: token bucket shared by all the threads of a run, it also bounds
+               the number of requests in flight
+- QuotaStore: calls sent per API key and per calendar day, kept in a SQLite
+              file so that the daily quota holds across runs and processes
+- KeyPool: several API keys, each with its own RateLimiter, the requests are
+           spread over the keys (throttled keys cool down, spent keys are
+           skipped)
+- ProgressETA: live progress report (requests done, rate, time left)
+- run_concurrently: map a function over a list of jobs with a pool of threads
+- iter_concurrently: same, but the results are yielded as they arrive
+'''
+
+import sys
+import time
+import sqlite3
+import datetime
+import threading
+from contextlib import contextmanager
+
+from multiprocessing.pool import ThreadPool
+
+
+class QuotaExceeded(Exception):
+    '''raised when the daily quota of calls for the API key is spent'''
+    pass
+
+
+class QuotaStore(object):
+    '''
+    number of calls sent per API key and per calendar day (local time)
+
+    usage:
+        store = QuotaStore('nyt_quota.sqlite')
+        keys = KeyPool(['key_1', 'key_2'], store=store)
+    '''
+
+    def __init__(self, path='nyt_quota.sqlite'):
+        self.path = path
+        self._lock = threading.Lock()
+        # timeout: other processes may be writing to the file
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS calls (
+                                    key TEXT NOT NULL,
+                                    day TEXT NOT NULL,
+                                    calls INTEGER NOT NULL,
+                                    PRIMARY KEY (key, day))''')
+            self._conn.commit()
+
+    def calls(self, key, day):
+        '''
+        parameters
+        ----------
+        key: as STR, the API key
+        day: as datetime.date
+
+        returns
+        -------
+        INT, number of calls sent with the key that day
+        '''
+        with self._lock:
+            row = self._conn.execute('SELECT calls FROM calls WHERE key = ? '
+                                     'AND day = ?',
+                                     (key, day.isoformat())).fetchone()
+        return row[0] if row is not None else 0
+
+    def add(self, key, day, n=1):
+        '''
+        counts n calls sent with the key that day
+
+        returns
+        -------
+        INT, number of calls sent with the key that day, by all the processes
+        '''
+        with self._lock:
+            with self._conn:
+                self._conn.execute('INSERT OR IGNORE INTO calls VALUES '
+                                   '(?, ?, 0)', (key, day.isoformat()))
+                self._conn.execute('UPDATE calls SET calls = calls + ? '
+                                   'WHERE key = ? AND day = ?',
+                                   (n, key, day.isoformat()))
+                row = self._conn.execute('SELECT calls FROM calls WHERE '
+                                         'key = ? AND day = ?',
+                                         (key, day.isoformat())).fetchone()
+        return row[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RateLimiter(object):
+    '''
+    token bucket limiting the calls to the API
+
+    the bucket is refilled at the rate of calls_per_second tokens per second
+    and holds at most burst tokens (1 by default, and it starts with them), a
+    request consumes one token: the calls are spaced by 1 / calls_per_second
+    seconds from the first one, no burst goes over the per second limit.
+    The daily budget is counted separately, per calendar day: once
+    calls_per_day requests have been sent today, QuotaExceeded is raised
+    instead of waiting. Without a QuotaStore the calls are only counted from
+    the start of the process (a new process starts with the full quota); with
+    one, the calls of the other runs and processes of the day are counted too.
+
+    usage:
+        with rate_limiter:
+            r = requests.get(url, params=search_params)
+    '''
+
+    def __init__(self, calls_per_second=5, calls_per_day=1000, max_in_flight=5,
+                 burst=1, store=None, key=''):
+        '''
+        parameters
+        ----------
+        calls_per_second: as FLOAT, defaults to 5
+                sustained rate allowed by the API
+        calls_per_day: as INT, defaults to 1000
+                number of calls allowed per API key and per day
+        max_in_flight: as INT, defaults to 5
+                maximum number of requests waiting for an answer at the same time
+        burst: as INT, defaults to 1
+                number of calls that can be sent at once after an idle time
+        store: as QuotaStore, optional
+                calls already sent today with the key, counted in memory only
+                (per process) if not given
+        key: as STR, defaults to ''
+                API key of the budget in the store
+        '''
+        self.calls_per_second = float(calls_per_second)
+        self.calls_per_day = calls_per_day
+        self.max_in_flight = max_in_flight
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last_refill = time.time()
+        self.store = store
+        self.key = key
+        self._day = datetime.date.today()
+        self._calls_today = store.calls(key, self._day) if store else 0
+        self._lock = threading.Lock()
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+
+    def _refill(self, now):
+        elapsed = now - self._last_refill
+        self._tokens = min(self.burst,
+                           self._tokens + elapsed * self.calls_per_second)
+        self._last_refill = now
+        today = datetime.date.today()
+        if today != self._day:
+            self._day = today
+            self._calls_today = self.store.calls(self.key, today) \
+                                if self.store else 0
+
+    def try_acquire(self):
+        '''
+        consumes a token if one is available, without waiting
+
+        returns
+        -------
+        0. if the token was consumed, otherwise the wait in seconds before the
+        next token
+        '''
+        with self._lock:
+            now = time.time()
+            self._refill(now)
+            if self._calls_today >= self.calls_per_day:
+                raise QuotaExceeded('daily quota of {} calls spent'\
+                                    .format(self.calls_per_day))
+            if self._tokens >= 1:
+                if self.store is not None:
+                    # also counts the calls of the other processes
+                    self._calls_today = self.store.add(self.key, self._day)
+                    if self._calls_today > self.calls_per_day:
+                        raise QuotaExceeded('daily quota of {} calls spent'\
+                                            .format(self.calls_per_day))
+                else:
+                    self._calls_today += 1
+                self._tokens -= 1
+                return 0.
+            return (1 - self._tokens) / self.calls_per_second
+
+    def acquire(self):
+        '''blocks until a token is available, then consumes it'''
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    @property
+    def remaining_today(self):
+        '''number of calls still available in the daily budget'''
+        with self._lock:
+            self._refill(time.time())
+            return max(self.calls_per_day - self._calls_today, 0)
+
+    def __enter__(self):
+        self._in_flight.acquire()
+        try:
+            self.acquire()
+        except Exception:
+            self._in_flight.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._in_flight.release()
+        return False
+
+
+class KeyPool(object):
+    '''
+    several API keys used together: the throughput and the daily quota add up
+
+    each key has its own token bucket (see RateLimiter). A request takes the
+    next key (round robin) that has a token available; a key answered with a
+    429 cools down for a while, a key that spent its daily quota is skipped.
+    QuotaExceeded is raised once all the keys are spent.
+
+    usage:
+        keys = KeyPool(['key_1', 'key_2'])
+        with keys.use() as key:
+            r = requests.get(url, params=dict(search_params, **{'api-key': key}))
+        if r.status_code == 429:
+            keys.throttled(key)
+    '''
+
+    def __init__(self, keys, calls_per_second=5, calls_per_day=1000,
+                 max_in_flight=5, cooldown=30., limiters=None, burst=1,
+                 store=None):
+        '''
+        parameters
+        ----------
+        keys: as LIST of STR, the API keys
+        calls_per_second, calls_per_day, burst: see RateLimiter
+                budget of each key
+        max_in_flight: as INT, defaults to 5
+                maximum number of requests in flight per key
+        cooldown: as FLOAT, defaults to 30.
+                seconds without using a key after a 429 (unless the answer
+                gives a Retry-After)
+        limiters: as LIST of RateLimiter, optional
+                the token bucket of each key, created from calls_per_second and
+                calls_per_day if not given (the same RateLimiter can be given
+                for all the keys to share one budget)
+        store: as QuotaStore, optional
+                calls already sent today with each key (by any process), only
+                used for the limiters created here
+        '''
+        if not keys:
+            raise ValueError('at least one API key is needed')
+        self.keys = list(keys)
+        if limiters is None:
+            limiters = [RateLimiter(calls_per_second, calls_per_day,
+                                    max_in_flight, burst, store, key)
+                        for key in self.keys]
+        self.limiters = dict(zip(self.keys, limiters))
+        self.cooldown = cooldown
+        self._cooldown_until = dict((key, 0.) for key in self.keys)
+        self._spent = set()
+        self._next = 0
+        self.stats = dict((key, {'requests': 0, 'throttled': 0})
+                          for key in self.keys)
+        self._lock = threading.Lock()
+        self._in_flight = threading.BoundedSemaphore(max_in_flight *
+                                                     len(self.keys))
+
+    def acquire(self):
+        '''
+        blocks until a key has a token available, then consumes it
+
+        returns
+        -------
+        STR, the key to use for the request
+        '''
+        while True:
+            waits = []
+            with self._lock:
+                now = time.time()
+                n = len(self.keys)
+                for i in range(n):
+                    key = self.keys[(self._next + i) % n]
+                    if key in self._spent:
+                        continue
+                    if self._cooldown_until[key] > now:
+                        waits.append(self._cooldown_until[key] - now)
+                        continue
+                    try:
+                        wait = self.limiters[key].try_acquire()
+                    except QuotaExceeded:
+                        self._spent.add(key)
+                        continue
+                    if not wait:
+                        self._next = (self._next + i + 1) % n
+                        self.stats[key]['requests'] += 1
+                        return key
+                    waits.append(wait)
+                if len(self._spent) == n:
+                    raise QuotaExceeded('daily quota spent for all the {} '
+                                        'API keys'.format(n))
+            time.sleep(min(waits))
+
+    @contextmanager
+    def use(self):
+        '''the key to use for one request, bounding the requests in flight'''
+        self._in_flight.acquire()
+        try:
+            yield self.acquire()
+        finally:
+            self._in_flight.release()
+
+    def throttled(self, key, wait=None):
+        '''
+        the key was answered with a 429: it is not used for wait seconds
+        (defaults to cooldown), the other keys take over
+        '''
+        with self._lock:
+            self.stats[key]['throttled'] += 1
+            self._cooldown_until[key] = time.time() + (wait if wait is not None
+                                                       else self.cooldown)
+
+    @property
+    def remaining_today(self):
+        '''number of calls still available in the daily budget of all the keys'''
+        return sum(self.limiters[key].remaining_today for key in self.keys
+                   if key not in self._spent)
+
+    def report(self):
+        '''
+        returns
+        -------
+        STR, requests and 429 per key (only the end of the keys is shown)
+        '''
+        return ', '.join('key ...{}: {} requests, {} throttled{}'.format(
+                            key[-4:], self.stats[key]['requests'],
+                            self.stats[key]['throttled'],
+                            ' (quota spent)' if key in self._spent else '')
+                         for key in self.keys)
+
+
+class ProgressETA(object):
+    '''
+    live report of the progress of a set of requests
+
+    the total can grow while the run goes on (e.g. the number of pages of a
+    year is only known after its first page came back)
+    '''
+
+    def __init__(self, total=0, label='requests', verbose=True, stream=None):
+        self.total = total
+        self.done = 0
+        self.label = label
+        self.verbose = verbose
+        self.stream = stream if stream is not None else sys.stdout
+        self._start = time.time()
+        self._lock = threading.Lock()
+
+    def add_total(self, n):
+        with self._lock:
+            self.total += n
+
+    def eta(self):
+        '''
+        returns
+        -------
+        estimated number of seconds left as FLOAT (None before the first update)
+        '''
+        elapsed = time.time() - self._start
+        if self.done == 0 or elapsed == 0:
+            return None
+        rate = self.done / elapsed
+        return max(self.total - self.done, 0) / rate
+
+    def update(self, n=1):
+        with self._lock:
+            self.done += n
+            if not self.verbose:
+                return
+            elapsed = time.time() - self._start
+            rate = self.done / elapsed if elapsed > 0 else 0.
+            eta = self.eta()
+            eta_str = '--:--' if eta is None else \
+                      '{:02d}:{:02d}'.format(int(eta) // 60, int(eta) % 60)
+            self.stream.write('\r{}: {}/{} ({:.1f}/s, ETA {})'\
+                    .format(self.label, self.done, self.total, rate, eta_str))
+            self.stream.flush()
+
+    def close(self):
+        if self.verbose:
+            self.stream.write('\n')
+            self.stream.flush()
+
+
+def run_concurrently(func, jobs, max_workers=5, progress=None):
+    '''
+    parameters
+    ----------
+    func: function taking a single job as argument
+    jobs: as LIST
+          the arguments to give to func
+    max_workers: as INT, defaults to 5
+          number of threads (the RateLimiter used by func still bounds the
+          number of requests actually sent at the same time)
+    progress: as ProgressETA, optional
+          updated every time a job is done
+
+    returns
+    -------
+    list of the results of func, in the same order as jobs
+    '''
+    jobs = list(jobs)
+    if not jobs:
+        return []
+
+    def run_one(job):
+        result = func(job)
+        if progress is not None:
+            progress.update()
+        return result
+
+    if max_workers <= 1 or len(jobs) == 1:
+        return [run_one(job) for job in jobs]
+
+    pool = ThreadPool(min(max_workers, len(jobs)))
+    try:
+        return pool.map(run_one, jobs)
+    finally:
+        pool.close()
+        pool.join()
+
+
+
+def iter_concurrently(func, jobs, max_workers=5, progress=None):
+    '''
+    generator version of run_concurrently: the results are yielded (in the
+    order of jobs) as soon as they are available, so that they can be
+    processed, and released, while the other jobs are still running
+
+    see docstring of run_concurrently for the parameters
+    '''
+    jobs = list(jobs)
+    if not jobs:
+        return
+
+    def run_one(job):
+        result = func(job)
+        if progress is not None:
+            progress.update()
+        return result
+
+    if max_workers <= 1 or len(jobs) == 1:
+        for job in jobs:
+            yield run_one(job)
+        return
+
+    pool = ThreadPool(min(max_workers, len(jobs)))
+    try:
+        for result in pool.imap(run_one, jobs):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
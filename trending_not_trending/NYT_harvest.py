@@ -0,0 +1,254 @@
+'''
+python 2.7
+
+harvester getting past the 100 pages cap of the NYT API
+
+the API gives at most 100 pages (1000 documents) back for a query, e.g. for
+'Donald Trump' in 2016 only a small part of the articles is obtained by
+get_all_NYT_data. The harvester splits the date range of the query in two
+halves, again and again, until each window has at most 1000 hits. All the
+pages of all the windows are then fetched concurrently, and can be streamed
+(stream, stream_years) instead of being kept in memory.
+
+a window that is a single day and still has more than 1000 hits can not be
+split anymore: it is reported as truncated in the coverage stats
+'''
+
+from NYT_planner import TrendPlanner, MAX_PAGES
+from NYT_windows import year_window, split_window, period_windows, \
+                        period_label
+
+
+class Harvester(object):
+    '''
+    usage:
+        harvester = Harvester(planner)
+        [(docs, stats)] = harvester.harvest('Donald Trump', [year_window(2016)])
+        print(harvester.report(stats))
+    '''
+
+    def __init__(self, planner=None, max_hits=MAX_PAGES*10,
+                 path_to_credentials='../../credentials/credentials.yml',
+                 verbose=False):
+        '''
+        parameters
+        ----------
+        planner: as TrendPlanner, optional
+                sends (and keeps) the requests, a new one is created if not given
+        max_hits: as INT, defaults to 1000
+                maximum number of hits in a window for all its documents to be
+                obtained
+        path_to_credentials: as STR
+                only used to create the planner
+        verbose: as BOOL, defaults to False
+                prints the progress in the terminal
+        '''
+        if planner is None:
+            planner = TrendPlanner(path_to_credentials, verbose=verbose)
+        self.planner = planner
+        self.max_hits = max_hits
+        self.verbose = verbose
+        # number of windows probed (page 0) by the last find_windows
+        self.probes = 0
+
+    def find_windows(self, term, top_windows):
+        '''
+        splits the windows until each part has at most max_hits hits, all the
+        windows of a same level are queried concurrently
+
+        parameters
+        ----------
+        term: as STR, the search term
+        top_windows: as LIST of TUPLE (begin_date, end_date), 'YYYYMMDD'
+
+        returns
+        -------
+        list with, for each of the top windows, the list of its parts (in
+        chronological order)
+        '''
+        pending = [(i, tuple(w)) for i, w in enumerate(top_windows)]
+        parts = [[] for w in top_windows]
+        level = 0
+        self.probes = 0
+        while pending:
+            # counted in the naive approach by stream, once the windows are
+            # known
+            self.planner.fetch([(term,) + w + (0,) for i, w in pending],
+                               'windows (level {})'.format(level),
+                               count_naive=False)
+            self.probes += len(pending)
+            next_pending = []
+            for i, w in pending:
+                halves = split_window(w) \
+                         if self.planner.hits(term, w) > self.max_hits else [w]
+                if len(halves) == 1:
+                    parts[i].append(w)
+                else:
+                    next_pending += [(i, half) for half in halves]
+            pending = next_pending
+            level += 1
+        return [sorted(windows) for windows in parts]
+
+    def stream(self, term, top_windows):
+        '''
+        generator: the documents are yielded page by page, as they arrive
+        (only page 0 of each window is kept by the planner)
+
+        parameters
+        ----------
+        term: as STR, the search term
+        top_windows: as LIST of TUPLE (begin_date, end_date), 'YYYYMMDD'
+
+        yields
+        ------
+        (index of the top window, list of the documents of one page)
+
+        once the generator is exhausted, self.stats holds, for each of the top
+        windows, the coverage stats as DICT
+            'hits': number of hits for the top window
+            'docs': number of documents obtained
+            'coverage': docs / hits
+            'windows': number of windows queried
+            'truncated_windows': windows (one day) with more than max_hits
+                                 hits, not fully obtained
+        '''
+        parts = self.find_windows(term, top_windows)
+        top_index = dict((w, i) for i, windows in enumerate(parts)
+                                for w in windows)
+
+        self.stats = []
+        for top_window, windows in zip(top_windows, parts):
+            self.stats.append({'hits': self.planner.hits(term, top_window),
+                               'docs': 0,
+                               'windows': len(windows),
+                               'truncated_windows': [w for w in windows
+                                if self.planner.hits(term, w) > self.max_hits]})
+
+        # the naive approach probes the windows the same way, then calls
+        # get_all_NYT_data for each part: page 0 for the hits, then every page
+        # (page 0 again). The planner reuses the page 0 of the probes.
+        leaves = [w for windows in parts for w in windows]
+        self.planner.stats['naive_requests'] += self.probes - len(leaves) + \
+                sum(1 + self.planner.num_pages(term, w) for w in leaves)
+        list_requests = [(term,) + w + (page,)
+                         for w in leaves
+                         for page in range(self.planner.num_pages(term, w))]
+        for req, data in self.planner.iter_pages(list_requests, 'pages',
+                                                 count_naive=False):
+            i = top_index[req[1:3]]
+            docs = data['response']['docs']
+            self.stats[i]['docs'] += len(docs)
+            yield i, docs
+
+        for stats in self.stats:
+            stats['coverage'] = float(stats['docs']) / stats['hits'] \
+                                if stats['hits'] else 1.
+
+    def harvest(self, term, top_windows):
+        '''
+        parameters
+        ----------
+        term: as STR, the search term
+        top_windows: as LIST of TUPLE (begin_date, end_date), 'YYYYMMDD'
+
+        returns
+        -------
+        list with, for each of the top windows:
+            - the list of the documents obtained (chronological order)
+            - the coverage stats as DICT (see docstring of stream)
+        '''
+        all_docs = [[] for w in top_windows]
+        for i, docs in self.stream(term, top_windows):
+            all_docs[i] += docs
+        return list(zip(all_docs, self.stats))
+
+    @staticmethod
+    def report(stats):
+        '''
+        returns
+        -------
+        STR, summary of the coverage of a harvest
+        '''
+        text = '{} documents out of {} hits ({:.1%} coverage) in {} windows'\
+               .format(stats['docs'], stats['hits'], stats['coverage'],
+                       stats['windows'])
+        if stats['truncated_windows']:
+            text += ', {} single days over the page cap'\
+                    .format(len(stats['truncated_windows']))
+        return text
+
+
+def harvest_years(search_term, start_year, end_year, planner=None,
+                  path_to_credentials='../../credentials/credentials.yml',
+                  verbose=False):
+    '''
+    parameters
+    ----------
+    search_term: as STR
+                the search term for the query to the NYT api
+    start_year: as INT
+                first year of the time range
+    end_year: as INT
+                last year of the time range (year included)
+    planner: as TrendPlanner, optional
+                shared planner (cache, rate limiter, responses already known)
+
+    returns
+    -------
+    dictionnary where keys are the years, values are the number of hits
+    dictionnary where keys are the years, values are the lists of documents
+    dictionnary where keys are the years, values are the coverage stats
+    '''
+    harvester = Harvester(planner, path_to_credentials=path_to_credentials,
+                          verbose=verbose)
+    years = range(start_year, end_year+1)
+    results = harvester.harvest(search_term,
+                                [year_window(year) for year in years])
+
+    dict_hits, dict_docs, dict_stats = {}, {}, {}
+    for year, (docs, stats) in zip(years, results):
+        if verbose: print('year {}: {}'.format(year, harvester.report(stats)))
+        dict_hits[year] = stats['hits']
+        dict_docs[year] = docs
+        dict_stats[year] = stats
+    return dict_hits, dict_docs, dict_stats
+
+
+def stream_years(search_term, start_year, end_year, planner=None,
+                 path_to_credentials='../../credentials/credentials.yml',
+                 verbose=False):
+    '''
+    streaming version of harvest_years
+
+    yields
+    ------
+    (year, list of the documents of one page)
+    the number of hits is then available from the planner
+    '''
+    return stream_periods(search_term, start_year, end_year, 'year',
+                          planner=planner,
+                          path_to_credentials=path_to_credentials,
+                          verbose=verbose)
+
+
+def stream_periods(search_term, start_year, end_year, granularity='year',
+                   planner=None,
+                   path_to_credentials='../../credentials/credentials.yml',
+                   verbose=False):
+    '''
+    same as stream_years, for periods of the given granularity ('year',
+    'quarter', 'month' or 'week', see NYT_windows.py)
+
+    yields
+    ------
+    (period, list of the documents of one page)
+    '''
+    harvester = Harvester(planner, path_to_credentials=path_to_credentials,
+                          verbose=verbose)
+    periods, windows = zip(*period_windows(start_year, end_year, granularity))
+    for i, docs in harvester.stream(search_term, windows):
+        yield periods[i], docs
+    if verbose:
+        for period, stats in zip(periods, harvester.stats):
+            print('{}: {}'.format(period_label(period, granularity),
+                                  harvester.report(stats)))
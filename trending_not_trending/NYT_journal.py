@@ -0,0 +1,160 @@
+'''
+python 2.7
+
+journal of a harvest: each (term, window, page) unit is written to a SQLite
+file as soon as its response is received, so that a job that died (crash,
+quota spent, Ctrl-C) can be resumed: the finished units are read back from the
+journal and only the other ones are requested from the API
+
+unlike the ResponseCache (see NYT_cache.py), the journal never expires nor
+evicts a unit: it holds the jobs in progress. Each unit belongs to a job (an
+id made from the arguments of the job, see job_id), so that jobs run at the
+same time share the file without touching each other's units: a new job
+(resume=False) only empties its own units
+
+only the responses actually sent by the API are recorded (the ones read from
+the cache were already done by a previous job). When the client has a cache,
+the body of the response is kept there and the journal only marks the unit as
+done (empty body), so that the responses are not stored twice
+'''
+
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+
+def job_id(arguments):
+    '''
+    parameters
+    ----------
+    arguments: as DICT, the arguments defining the job (e.g. the search terms
+               and the years of the command line)
+
+    returns
+    -------
+    STR, the same id for the same arguments, whatever their order
+    '''
+    text = json.dumps(arguments, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+class HarvestJournal(object):
+    '''
+    usage:
+        journal = HarvestJournal('nyt_journal.sqlite', resume=True,
+                                 job=job_id({'terms': terms, ...}))
+        client = NYTClient(path_to_credentials, journal=journal)
+        ... the units in the journal are not requested again ...
+        print(journal.report())
+    '''
+
+    def __init__(self, path='nyt_journal.sqlite', resume=False, job=''):
+        '''
+        parameters
+        ----------
+        path: as STR, defaults to 'nyt_journal.sqlite'
+              path to the SQLite file (created if it does not exist)
+        resume: as BOOL, defaults to False
+              True: the units of the previous run of the job are reused
+              False: the units of the job are removed, the job starts again
+        job: as STR, defaults to ''
+              id of the job (see job_id), the units of the other jobs are
+              left as they are
+        '''
+        self.path = path
+        self.job = job
+        self.resumed = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+        # timeout: other jobs may be writing to the file
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            columns = [row[1] for row in
+                       self._conn.execute('PRAGMA table_info(units)')]
+            if columns and 'job' not in columns:
+                # journal of a former version, without jobs
+                self._conn.execute('DROP TABLE units')
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS units (
+                                    job TEXT NOT NULL,
+                                    term TEXT NOT NULL,
+                                    begin_date TEXT NOT NULL,
+                                    end_date TEXT NOT NULL,
+                                    page INTEGER NOT NULL,
+                                    fields TEXT NOT NULL,
+                                    body TEXT NOT NULL,
+                                    done REAL NOT NULL,
+                                    PRIMARY KEY (job, term, begin_date,
+                                                 end_date, page, fields))''')
+            if not resume:
+                self._conn.execute('DELETE FROM units WHERE job = ?', (job,))
+            self._conn.commit()
+            self.units_at_start = self._conn.execute(
+                                    'SELECT COUNT(*) FROM units WHERE job = ?',
+                                    (job,)).fetchone()[0]
+
+    @staticmethod
+    def unit(search_params):
+        '''
+        returns
+        -------
+        TUPLE (term, begin_date, end_date, page, fields) of a request
+        '''
+        return (search_params.get('q', ''),
+                str(search_params.get('begin_date', '')),
+                str(search_params.get('end_date', '')),
+                int(search_params.get('page', 0)),
+                search_params.get('fl', ''))
+
+    def get(self, search_params):
+        '''
+        returns
+        -------
+        the text of the response if the unit is finished, '' if it is finished
+        and its response is in the cache, None otherwise
+        '''
+        with self._lock:
+            row = self._conn.execute('SELECT body FROM units WHERE job = ? '
+                                     'AND term = ? AND begin_date = ? '
+                                     'AND end_date = ? AND page = ? '
+                                     'AND fields = ?', (self.job,) +
+                                     self.unit(search_params)).fetchone()
+            if row is not None:
+                self.resumed += 1
+        return row[0] if row is not None else None
+
+    def record(self, search_params, text=''):
+        '''
+        marks the unit as finished, committed at once
+
+        text: as STR, defaults to ''
+              the text of the response, '' if it is kept in the cache
+        '''
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO units '
+                               'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                               (self.job,) + self.unit(search_params) +
+                               (text, time.time()))
+            self._conn.commit()
+            self.recorded += 1
+
+    def report(self):
+        '''
+        returns
+        -------
+        STR, number of units reused and recorded
+        '''
+        return '{} units resumed from the journal ({} in it at start), ' \
+               '{} new units recorded'.format(self.resumed, self.units_at_start,
+                                              self.recorded)
+
+    def clear(self):
+        '''removes the units of the job'''
+        with self._lock:
+            self._conn.execute('DELETE FROM units WHERE job = ?', (self.job,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
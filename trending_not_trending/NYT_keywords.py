@@ -0,0 +1,178 @@
+'''
+python 2.7
+
+compact store of the keywords of the articles, per period (year, month...)
+
+instead of a list holding every keyword string of every article (dict of
+lists), each distinct keyword is interned once and given an integer id, and
+only the counts of the ids are kept per period, in NumPy arrays:
+- the ids of a page are appended to a buffer (array of 32-bit INT)
+- when the buffer is large, it is folded in the sparse counts of the period
+  (sorted ids and their counts), with vectorized NumPy operations
+so that a full harvest needs a few MB instead of GB of Python strings, and
+the top keywords of a period are found with a partial sort
+'''
+
+from array import array
+
+import numpy as np
+
+
+class KeywordStore(object):
+    '''
+    usage:
+        store = KeywordStore()
+        store.add(2016, ['Trump, Donald J', 'Presidential Election of 2016'])
+        store.top_k(2016, 10)       # [(keyword, count), ...]
+        store.frequencies(2016)     # {keyword: count}
+
+    for the functions expecting a DICT of LIST, store[period] gives the list
+    of the keywords of the period (each one repeated count times)
+    '''
+
+    def __init__(self, buffer_size=1 << 20):
+        '''
+        parameters
+        ----------
+        buffer_size: as INT, defaults to 1M
+                number of ids kept per period before they are folded in the
+                counts
+        '''
+        self.vocabulary = {}    # keyword -> id
+        self.words = []         # id -> keyword
+        self.buffer_size = buffer_size
+        self._buffers = {}      # period -> array of the ids not counted yet
+        self._counts = {}       # period -> (sorted ids, counts)
+
+    ########    interning
+
+    def intern(self, keyword):
+        '''
+        returns
+        -------
+        INT, the id of the keyword (a new id if it was never seen)
+        '''
+        i = self.vocabulary.get(keyword)
+        if i is None:
+            i = len(self.words)
+            self.vocabulary[keyword] = i
+            self.words.append(keyword)
+        return i
+
+    ########    adding keywords
+
+    def add(self, period, keywords):
+        '''adds the keywords (LIST of STR, e.g. of one article) to the period'''
+        buf = self._buffers.get(period)
+        if buf is None:
+            buf = self._buffers[period] = array('i')
+        buf.extend(self.intern(keyword) for keyword in keywords)
+        if len(buf) >= self.buffer_size:
+            self._fold(period)
+
+    def add_counts(self, period, frequencies):
+        '''adds a DICT keyword -> count to the period'''
+        ids = np.array([self.intern(keyword) for keyword in frequencies],
+                       dtype=np.int64)
+        counts = np.array(list(frequencies.values()), dtype=np.int64)
+        self._fold(period)
+        self._merge(period, ids, counts)
+
+    def _fold(self, period):
+        '''counts the ids of the buffer of the period'''
+        buf = self._buffers.pop(period, None)
+        if buf is not None and len(buf):
+            ids, counts = np.unique(np.frombuffer(buf, dtype=np.intc),
+                                    return_counts=True)
+            self._merge(period, ids, counts)
+        elif period not in self._counts:
+            self._counts[period] = (np.zeros(0, dtype=np.int64),
+                                    np.zeros(0, dtype=np.int64))
+
+    def _merge(self, period, ids, counts):
+        '''adds sparse counts (ids, counts) to the counts of the period'''
+        if period in self._counts:
+            old_ids, old_counts = self._counts[period]
+            ids = np.concatenate([old_ids, ids])
+            counts = np.concatenate([old_counts, counts])
+        merged_ids, inverse = np.unique(ids, return_inverse=True)
+        merged_counts = np.bincount(inverse, weights=counts,
+                                    minlength=len(merged_ids))
+        self._counts[period] = (merged_ids.astype(np.int64),
+                                merged_counts.astype(np.int64))
+
+    ########    lookups
+
+    def periods(self):
+        '''LIST of the periods with keywords, sorted'''
+        return sorted(set(self._counts) | set(self._buffers))
+
+    def counts(self, period):
+        '''
+        returns
+        -------
+        (ids, counts) of the period as NumPy arrays, ids in increasing order
+        '''
+        self._fold(period)
+        return self._counts[period]
+
+    def total(self, period):
+        '''number of keywords (with repetitions) of the period'''
+        return int(self.counts(period)[1].sum())
+
+    def frequencies(self, period):
+        '''
+        returns
+        -------
+        DICT keyword -> count for the period
+        '''
+        ids, counts = self.counts(period)
+        return dict((self.words[i], int(c)) for i, c in zip(ids, counts))
+
+    def top_k(self, period, k=10):
+        '''
+        returns
+        -------
+        LIST of the k most frequent (keyword, count) of the period, the most
+        frequent first
+        '''
+        ids, counts = self.counts(period)
+        if k <= 0:
+            return []
+        if len(ids) > k:
+            best = np.argpartition(-counts, k - 1)[:k]
+        else:
+            best = np.arange(len(ids))
+        best = best[np.argsort(-counts[best], kind='mergesort')]
+        return [(self.words[ids[i]], int(counts[i])) for i in best]
+
+    @property
+    def nbytes(self):
+        '''approximate memory used by the counts and buffers, in bytes'''
+        size = sum(ids.nbytes + counts.nbytes
+                   for ids, counts in self._counts.values())
+        size += sum(buf.itemsize * len(buf) for buf in self._buffers.values())
+        return size
+
+    ########    DICT of LIST interface
+
+    def keys(self):
+        return self.periods()
+
+    def __iter__(self):
+        return iter(self.periods())
+
+    def __len__(self):
+        return len(self.periods())
+
+    def __contains__(self, period):
+        return period in self._counts or period in self._buffers
+
+    def __getitem__(self, period):
+        if period not in self:
+            raise KeyError(period)
+        return [keyword for keyword, count in self.top_k(period, len(self.words))
+                for n in range(count)]
+
+    def get(self, period, default=None):
+        return self[period] if period in self else default
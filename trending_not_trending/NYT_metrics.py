@@ -0,0 +1,238 @@
+'''
+python 2.7
+
+metrics of the requests sent to the NYT API during a run, to find out where
+the time of a slow trend job goes (API latency, throttling, JSON parsing,
+wordclouds...)
+
+for each request the client (see NYT_client.py) records
+- the latency of each attempt and its status code
+- the number of retries
+- the size of the response (decoded, and on the wire)
+- the time spent parsing the JSON
+- whether it was answered by the cache
+
+the stages of a run (fetching, wordclouds...) can be timed as well. The
+metrics are aggregated per run and exported as a JSON report or as a
+Prometheus textfile (node_exporter textfile collector)
+'''
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(sorted_values, p):
+    '''
+    parameters
+    ----------
+    sorted_values: as LIST of FLOAT, in increasing order
+    p: as FLOAT, between 0 and 100
+
+    returns
+    -------
+    FLOAT, nearest-rank percentile (0. if there are no values)
+    '''
+    if not sorted_values:
+        return 0.
+    rank = int(round(p / 100. * (len(sorted_values) - 1)))
+    return sorted_values[rank]
+
+
+def summarize(values):
+    '''
+    returns
+    -------
+    DICT with 'count', 'sum', 'mean', 'max' and the PERCENTILES ('p50'...)
+    '''
+    values = sorted(values)
+    summary = {'count': len(values),
+               'sum': sum(values),
+               'mean': sum(values) / len(values) if values else 0.,
+               'max': values[-1] if values else 0.}
+    for p in PERCENTILES:
+        summary['p{}'.format(p)] = percentile(values, p)
+    return summary
+
+
+class FetchMetrics(object):
+    '''
+    usage:
+        metrics = FetchMetrics()
+        client = NYTClient(path_to_credentials, metrics=metrics)
+        with metrics.stage('wordclouds'):
+            ...
+        metrics.write_json('metrics.json')
+        metrics.write_prometheus('nyt.prom')
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.latencies = []
+            self.parse_times = []
+            self.status_codes = {}
+            self.retries = 0
+            self.errors = 0
+            self.decoded_bytes = 0
+            self.wire_bytes = 0
+            self.responses = 0
+            self.cache_hits = 0
+            self.cache_misses = 0
+            self.stages = {}
+
+    def record_attempt(self, latency, status=None):
+        '''
+        one attempt of a request: latency in seconds, status code (None for a
+        connection error or a timeout)
+        '''
+        with self._lock:
+            self.latencies.append(latency)
+            if status is None:
+                self.errors += 1
+            else:
+                key = str(status)
+                self.status_codes[key] = self.status_codes.get(key, 0) + 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_response(self, decoded, wire):
+        '''size in bytes of a response received from the API'''
+        with self._lock:
+            self.responses += 1
+            self.decoded_bytes += decoded
+            self.wire_bytes += wire
+
+    def record_parse(self, seconds):
+        with self._lock:
+            self.parse_times.append(seconds)
+
+    def record_cache(self, hit):
+        with self._lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    @contextmanager
+    def stage(self, name):
+        '''times a stage of the run, the times of a same stage are added'''
+        start = time.time()
+        try:
+            yield
+        finally:
+            elapsed = time.time() - start
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0.) + elapsed
+
+    def to_dict(self):
+        '''
+        returns
+        -------
+        DICT, the metrics aggregated for the run
+        '''
+        with self._lock:
+            lookups = self.cache_hits + self.cache_misses
+            return {'wall_time': time.time() - self.started,
+                    'latency': summarize(self.latencies),
+                    'parse_time': summarize(self.parse_times),
+                    'status_codes': dict(self.status_codes),
+                    'retries': self.retries,
+                    'connection_errors': self.errors,
+                    'responses': self.responses,
+                    'bytes': {'decoded': self.decoded_bytes,
+                              'wire': self.wire_bytes},
+                    'cache': {'hits': self.cache_hits,
+                              'misses': self.cache_misses,
+                              'hit_rate': float(self.cache_hits) / lookups
+                                          if lookups else 0.},
+                    'stages': dict(self.stages)}
+
+    def report(self):
+        '''
+        returns
+        -------
+        STR, short summary for the terminal
+        '''
+        m = self.to_dict()
+        return ('{} requests sent (retries included), latency p50 {:.0f} ms / '
+                'p95 {:.0f} ms, {} retries, status {}, cache hit rate {:.0%}, '
+                'parsing {:.2f} s').format(m['latency']['count'],
+                    m['latency']['p50'] * 1000, m['latency']['p95'] * 1000,
+                    m['retries'], json.dumps(m['status_codes'], sort_keys=True),
+                    m['cache']['hit_rate'], m['parse_time']['sum'])
+
+    def write_json(self, path):
+        '''writes the JSON report of the run'''
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, sort_keys=True)
+
+    def prometheus_text(self, prefix='nyt'):
+        '''
+        returns
+        -------
+        STR, the metrics in the Prometheus text exposition format
+        '''
+        m = self.to_dict()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append('# HELP {}_{} {}'.format(prefix, name, help_text))
+            lines.append('# TYPE {}_{} {}'.format(prefix, name, kind))
+            for labels, value in samples:
+                lines.append('{}_{}{} {}'.format(prefix, name, labels,
+                                                 repr(float(value))))
+
+        for name, key, help_text in [
+                ('request_latency_seconds', 'latency',
+                 'latency of the attempts of the requests to the API'),
+                ('parse_seconds', 'parse_time',
+                 'time spent decoding the JSON responses')]:
+            summary = m[key]
+            samples = [('{{quantile="{}"}}'.format(p / 100.),
+                        summary['p{}'.format(p)]) for p in PERCENTILES]
+            metric(name, 'summary', help_text, samples)
+            lines.append('{}_{}_sum {}'.format(prefix, name,
+                                               repr(float(summary['sum']))))
+            lines.append('{}_{}_count {}'.format(prefix, name,
+                                                 summary['count']))
+
+        metric('responses_total', 'counter', 'responses per status code',
+               [('{{status="{}"}}'.format(status), count)
+                for status, count in sorted(m['status_codes'].items())])
+        metric('retries_total', 'counter', 'requests sent again',
+               [('', m['retries'])])
+        metric('connection_errors_total', 'counter',
+               'connection errors and timeouts', [('', m['connection_errors'])])
+        metric('response_bytes_total', 'counter', 'size of the responses',
+               [('{encoding="decoded"}', m['bytes']['decoded']),
+                ('{encoding="wire"}', m['bytes']['wire'])])
+        metric('cache_lookups_total', 'counter', 'lookups in the response cache',
+               [('{result="hit"}', m['cache']['hits']),
+                ('{result="miss"}', m['cache']['misses'])])
+        metric('stage_seconds', 'gauge', 'duration of the stages of the run',
+               [('{{stage="{}"}}'.format(stage), seconds)
+                for stage, seconds in sorted(m['stages'].items())])
+        metric('run_seconds', 'gauge', 'duration of the run',
+               [('', m['wall_time'])])
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path, prefix='nyt'):
+        '''
+        writes the Prometheus textfile, through a temporary file so that the
+        collector never reads a partial file
+        '''
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.prometheus_text(prefix))
+        os.rename(tmp_path, path)
@@ -0,0 +1,308 @@
+'''
+python 2.7
+
+local stand-in for the NYT Article Search API (/svc/search/v2/articlesearch.json)
+to test and benchmark the scripts without an API key or a network connection
+
+- recorded fixtures: the responses stored in a ResponseCache file (see
+  NYT_cache.py) by previous runs are served again as they are
+- synthetic fixtures: for the other queries, the number of hits is derived
+  from the search term and the number of days of the window (or given per
+  term), and the documents of the page are generated (_id, pub_date, keywords)
+- a query without search term gives all the articles of the window
+- pagination as the API: 10 documents per page, at most 100 pages
+- configurable latency, and throttling (429) above a number of calls per second
+  for an API key
+- the responses are compressed (gzip) if the client accepts it, and the field
+  list 'fl' is applied
+
+usage:
+    $ python NYT_mock_server.py --port 8080 --latency 0.05
+    client = NYTClient(path_to_credentials, url=server.url)
+'''
+
+import json
+import gzip
+import time
+import random
+import hashlib
+import sqlite3
+import datetime
+import threading
+from io import BytesIO
+
+try:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+except ImportError:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+
+import argparse #for command line
+
+from NYT_cache import ResponseCache
+from NYT_planner import MAX_PAGES
+from NYT_windows import to_date
+
+SEARCH_PATH = '/svc/search/v2/articlesearch.json'
+
+PAGE_SIZE = 10
+
+
+class FixtureStore(object):
+    '''
+    the responses of the mock server, recorded (from a ResponseCache file) or
+    synthetic
+    '''
+
+    def __init__(self, recorded_path=None, hits=None, hits_per_day=3,
+                 keywords_per_doc=5, total_per_day=200):
+        '''
+        parameters
+        ----------
+        recorded_path: as STR, optional
+                ResponseCache file with recorded responses, served first
+        hits: as DICT, optional
+                number of hits per year for some search terms, e.g.
+                {'Donald Trump': 25000}, scaled to the length of the window
+        hits_per_day: as FLOAT, defaults to 3
+                average number of hits per day for the other search terms (a
+                factor between 0.5 and 1.5 is drawn from the term)
+        keywords_per_doc: as INT, defaults to 5
+        total_per_day: as FLOAT, defaults to 200
+                number of articles per day, for the queries without search
+                term (a factor between 0.8 and 1.2 is drawn from the year)
+        '''
+        self.recorded = {}
+        if recorded_path is not None:
+            conn = sqlite3.connect(recorded_path)
+            for key, body in conn.execute('SELECT key, body FROM responses'):
+                self.recorded[key] = body
+            conn.close()
+        self.hits = hits or {}
+        self.hits_per_day = hits_per_day
+        self.keywords_per_doc = keywords_per_doc
+        self.total_per_day = total_per_day
+
+    @staticmethod
+    def _seed(*values):
+        '''stable integer drawn from the values (same on every run)'''
+        text = '|'.join(str(value) for value in values)
+        return int(hashlib.md5(text.encode('utf-8')).hexdigest()[:8], 16)
+
+    def num_hits(self, term, begin, end):
+        '''number of hits of a synthetic query'''
+        days = (end - begin).days + 1
+        if not term:
+            factor = 0.8 + self._seed(begin.year) % 400 / 1000.
+            return int(round(self.total_per_day * factor * days))
+        if term in self.hits:
+            return int(round(self.hits[term] * days / 365.))
+        factor = 0.5 + self._seed(term) % 1000 / 1000.
+        return int(round(self.hits_per_day * factor * days))
+
+    def make_doc(self, term, begin, end, rank):
+        '''synthetic document, the rank-th of the query'''
+        seed = self._seed(term, begin, end, rank)
+        day = begin + datetime.timedelta(days=seed % ((end - begin).days + 1))
+        keywords = [{'name': 'subject', 'rank': i + 1,
+                     'value': 'Keyword {}'.format(self._seed(seed, i) % 50)}
+                    for i in range(self.keywords_per_doc)]
+        return {'_id': hashlib.md5(str(seed).encode('utf-8')).hexdigest(),
+                'pub_date': day.isoformat() + 'T05:00:00Z',
+                'keywords': keywords,
+                'headline': {'main': '{} article {}'.format(term, rank)},
+                'snippet': 'synthetic article for the mock server',
+                'web_url': 'http://localhost/{}'.format(seed)}
+
+    def response(self, params):
+        '''
+        parameters
+        ----------
+        params: as DICT, the parameters of the GET request
+
+        returns
+        -------
+        (status code, body as STR)
+        '''
+        key = ResponseCache.make_key(params)
+        if key in self.recorded:
+            return 200, self.recorded[key]
+
+        page = int(params.get('page', 0))
+        if page >= MAX_PAGES or page < 0:
+            return 400, json.dumps({'status': 'ERROR',
+                                    'errors': ['page must be between 0 and '
+                                               '{}'.format(MAX_PAGES - 1)]})
+        term = params.get('q', '')
+        begin = to_date(params.get('begin_date', '19810101'))
+        end = to_date(params.get('end_date',
+                                 datetime.date.today().strftime('%Y%m%d')))
+        hits = self.num_hits(term, begin, end)
+        first = page * PAGE_SIZE
+        docs = [self.make_doc(term, begin, end, rank)
+                for rank in range(first, min(first + PAGE_SIZE, hits))]
+        if params.get('fl'):
+            fields = params['fl'].split(',')
+            docs = [dict((k, v) for k, v in doc.items() if k in fields)
+                    for doc in docs]
+        return 200, json.dumps({'status': 'OK',
+                                'response': {'meta': {'hits': hits,
+                                                      'offset': first,
+                                                      'time': 10},
+                                             'docs': docs}})
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    '''answers the GET requests with the fixtures of the server'''
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        if url.path != SEARCH_PATH:
+            return self._reply(404, json.dumps({'fault': 'not found'}))
+
+        params = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+        if server.latency:
+            time.sleep(server.latency * random.uniform(0.5, 1.5))
+        if server.throttled(params.get('api-key', '')):
+            return self._reply(429, json.dumps(
+                        {'fault': {'faultstring': 'Rate limit quota violation',
+                                   'detail': {'errorcode': 'policies.ratelimit.'
+                                                    'QuotaViolation'}}}))
+        status, body = server.fixtures.response(params)
+        self._reply(status, body)
+
+    def _reply(self, status, body):
+        raw = body.encode('utf-8')
+        gzipped = 'gzip' in self.headers.get('Accept-Encoding', '')
+        if gzipped:
+            buf = BytesIO()
+            with gzip.GzipFile(fileobj=buf, mode='wb') as f:
+                f.write(raw)
+            raw = buf.getvalue()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(raw)))
+        self.end_headers()
+        self.server.count(status, len(raw))
+        self.wfile.write(raw)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class MockNYTServer(ThreadingMixIn, HTTPServer):
+    '''
+    usage:
+        server = MockNYTServer(port=0, latency=0.05).start()
+        client = NYTClient(path_to_credentials, url=server.url)
+        ...
+        print(server.stats)
+        server.stop()
+    '''
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, fixtures=None, latency=0.,
+                 calls_per_second=None, verbose=False):
+        '''
+        parameters
+        ----------
+        host: as STR, defaults to '127.0.0.1'
+        port: as INT, defaults to 0 (a free port is chosen)
+        fixtures: as FixtureStore, optional
+                synthetic fixtures only if not given
+        latency: as FLOAT, defaults to 0.
+                average time in seconds to answer a request (+/- 50%)
+        calls_per_second: as FLOAT, optional
+                the requests of an API key above this rate are answered with a
+                429 (the API allows 5 calls per second), no throttling if not
+                given
+        verbose: as BOOL, defaults to False
+                logs each request in the terminal
+        '''
+        HTTPServer.__init__(self, (host, port), MockHandler)
+        self.fixtures = fixtures if fixtures is not None else FixtureStore()
+        self.latency = latency
+        self.calls_per_second = calls_per_second
+        self.verbose = verbose
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._thread = None
+        self.reset_stats()
+
+    @property
+    def url(self):
+        return 'http://{}:{}{}'.format(self.server_address[0],
+                                       self.server_address[1], SEARCH_PATH)
+
+    def throttled(self, key):
+        '''True if the request goes over calls_per_second for the API key'''
+        if not self.calls_per_second:
+            return False
+        with self._lock:
+            now = time.time()
+            calls = [t for t in self._calls.get(key, []) if now - t < 1.]
+            self._calls[key] = calls
+            if len(calls) >= self.calls_per_second:
+                return True
+            calls.append(now)
+            return False
+
+    def count(self, status, size):
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['bytes'] += size
+            key = str(status)
+            self.stats['status'][key] = self.stats['status'].get(key, 0) + 1
+
+    def reset_stats(self):
+        '''stats: number of requests, bytes sent and count per status code'''
+        with self._lock:
+            self.stats = {'requests': 0, 'bytes': 0, 'status': {}}
+
+    def start(self):
+        '''serves the requests in a background thread'''
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for the NYT '
+                                                 'Article Search API')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.,
+                        help='average time in seconds to answer a request')
+    parser.add_argument('--rate', dest='calls_per_second', type=float,
+                        help='answer 429 above this number of calls per second')
+    parser.add_argument('--recorded', type=str,
+                        help='ResponseCache file (e.g. nyt_cache.sqlite) with '
+                             'recorded responses to serve')
+    parser.add_argument('--hits-per-day', dest='hits_per_day', type=float,
+                        default=3, help='average hits per day of the '
+                                        'synthetic queries')
+    args = parser.parse_args()
+
+    fixtures = FixtureStore(args.recorded, hits_per_day=args.hits_per_day)
+    server = MockNYTServer(port=args.port, fixtures=fixtures,
+                           latency=args.latency,
+                           calls_per_second=args.calls_per_second,
+                           verbose=True)
+    print ('serving {}'.format(server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
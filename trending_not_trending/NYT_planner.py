@@ -0,0 +1,265 @@
+'''
+python 2.7
+
+request planner for the trend jobs: a job is a list of search terms, a range of
+years and the kind of data needed ('hits only' for NYT_api.py, 'hits + keywords'
+for NYT_api_advanced.py)
+
+the planner builds the smallest set of GET requests for the job:
+- every (term, year) is queried once, even if the term is repeated
+- page 0 gives the number of hits AND the first 10 documents, it is reused by
+  the keywords stage instead of being requested a second time
+- the responses are kept by the planner, a second job on the same planner
+  (e.g. hits only, then hits + keywords) only sends the missing pages
+- stream only keeps page 0 (the hits): the other pages are yielded as they
+  arrive and then released, the memory does not grow with the number of pages
+
+the number of requests saved, compared to the naive approach (one call to
+extract_num_hits / get_all_NYT_data per term and year), is reported in stats
+(for a harvest, see NYT_harvest.py, the naive approach probes the same
+windows and calls get_all_NYT_data for each of them)
+
+a request is identified by (term, begin_date, end_date, page), the dates are
+formatted as 'YYYYMMDD' (see NYT_windows.py)
+'''
+
+import math
+
+from NYT_client import NYTClient
+from NYT_fetch import ProgressETA, iter_concurrently
+from NYT_windows import period_windows
+
+# the API does not give more than 100 pages (of 10 documents) back
+MAX_PAGES = 100
+
+
+def unique(items):
+    '''items without repetition, in the order of first appearance'''
+    seen = set()
+    return [x for x in items if not (x in seen or seen.add(x))]
+
+
+class TrendPlanner(object):
+    '''
+    usage:
+        planner = TrendPlanner(client=NYTClient(path_to_credentials, cache=cache))
+        results = planner.run(['Donald Trump'], 2005, 2015, with_keywords=True)
+        results['Donald Trump']['hits'][2015]
+        results['Donald Trump']['docs'][2015]
+        print(planner.report())
+    '''
+
+    def __init__(self, path_to_credentials='../../credentials/credentials.yml',
+                 cache=None, rate_limiter=None, max_workers=5, verbose=False,
+                 client=None):
+        '''
+        parameters
+        ----------
+        path_to_credentials, cache, rate_limiter:
+                only used to create the client if not given (see NYT_client.py)
+        max_workers: as INT, defaults to 5
+                number of requests prepared concurrently
+        verbose: as BOOL, defaults to False
+                prints the progress of each stage in the terminal
+        client: as NYTClient, optional
+                sends the requests (cache, rate limiter, connection pool)
+        '''
+        if client is None:
+            client = NYTClient(path_to_credentials, cache=cache,
+                               rate_limiter=rate_limiter)
+        self.client = client
+        self.max_workers = max_workers
+        self.verbose = verbose
+        # responses already obtained
+        # key: (term, begin_date, end_date, page), value: DICT
+        self.responses = {}
+        self.stats = {'naive_requests': 0, 'planned_requests': 0,
+                      'sent_requests': 0}
+
+    def fetch(self, list_requests, label='requests', count_naive=True):
+        '''
+        sends the requests of list_requests that have no response yet
+
+        parameters
+        ----------
+        list_requests: as LIST of (term, begin_date, end_date, page)
+        label: as STR, name of the stage for the progress report
+        count_naive: as BOOL, defaults to True
+                all the requests of list_requests are counted in the naive
+                approach (run counts them itself)
+        '''
+        for req, data in self.iter_pages(list_requests, label, count_naive,
+                                         known_first=False):
+            self.responses[req] = data
+
+    def _fetch_one(self, req):
+        r = self.client.get(self.client.search_params(*req))
+        return req, getattr(r, 'from_cache', False), self.client.decode(r)
+
+    def iter_pages(self, list_requests, label='pages', count_naive=True,
+                   known_first=True):
+        '''
+        generator: yields (request, response as DICT) for each request of
+        list_requests, the responses that are not known yet are yielded as
+        they arrive and are NOT kept by the planner
+
+        parameters
+        ----------
+        see docstring of fetch
+        known_first: as BOOL, defaults to True
+                the responses already known are yielded too (first)
+        '''
+        if count_naive:
+            self.stats['naive_requests'] += len(list_requests)
+        list_requests = unique(list_requests)
+        missing = [req for req in list_requests if req not in self.responses]
+        self.stats['planned_requests'] += len(missing)
+
+        if known_first:
+            for req in list_requests:
+                if req in self.responses:
+                    yield req, self.responses[req]
+        if not missing:
+            return
+
+        progress = ProgressETA(len(missing), label=label, verbose=self.verbose)
+        for req, from_cache, data in iter_concurrently(self._fetch_one, missing,
+                                        max_workers=self.max_workers,
+                                        progress=progress):
+            if not from_cache:
+                self.stats['sent_requests'] += 1
+            yield req, data
+        progress.close()
+
+    def hits(self, term, window):
+        '''number of hits for (term, window), page 0 must be known'''
+        return self.responses[(term,) + tuple(window) + (0,)]\
+                             ['response']['meta']['hits']
+
+    def num_pages(self, term, window):
+        '''number of pages to query for (term, window), page 0 must be known'''
+        return min(int(math.ceil(self.hits(term, window)/10.)), MAX_PAGES)
+
+    def docs(self, term, window):
+        '''
+        returns
+        -------
+        list of the documents of all the pages of (term, window), the pages
+        must be known
+        '''
+        docs = []
+        for page in range(self.num_pages(term, window)):
+            docs += self.responses[(term,) + tuple(window) + (page,)]\
+                                  ['response']['docs']
+        return docs
+
+    def run(self, terms, start_year, end_year, with_keywords=False,
+            granularity='year'):
+        '''
+        parameters
+        ----------
+        terms: as LIST of STR
+               the search terms
+        start_year: as INT
+               first year of the time range
+        end_year: as INT
+               last year of the time range (year included)
+        with_keywords: as BOOL, defaults to False
+               False: only the number of hits is needed (find_trend)
+               True: the documents of all the pages are needed as well
+                     (wraper_function_data)
+        granularity: as STR, defaults to 'year'
+               'year', 'quarter', 'month' or 'week' (see NYT_windows.py)
+
+        returns
+        -------
+        DICT with the terms as keys, values are DICT with
+            'hits': DICT period -> number of hits
+            'docs': DICT period -> list of the documents (only with_keywords)
+        the periods are the years (as INT) for the 'year' granularity
+        '''
+        periods, windows = zip(*period_windows(start_year, end_year,
+                                               granularity))
+        unique_terms = unique(terms)
+
+        ########    stage 1: number of hits (page 0 of each term and year)
+        self.fetch([(term,) + window + (0,) for term in unique_terms
+                                            for window in windows],
+                   'hits', count_naive=False)
+
+        ########    stage 2: all the pages, page 0 is reused
+        if with_keywords:
+            self.fetch([(term,) + window + (page,)
+                        for term in unique_terms
+                        for window in windows
+                        for page in range(1, self.num_pages(term, window))],
+                       'pages', count_naive=False)
+
+        ########    regroup and count what the naive approach would have sent
+        results = {}
+        for term in unique_terms:
+            results[term] = {'hits': {}, 'docs': {}}
+            for period, window in zip(periods, windows):
+                results[term]['hits'][period] = self.hits(term, window)
+                if with_keywords:
+                    results[term]['docs'][period] = self.docs(term, window)
+
+        for term in terms:
+            for window in windows:
+                # get_all_NYT_data requests page 0 for the hits then every page
+                self.stats['naive_requests'] += 1
+                if with_keywords:
+                    self.stats['naive_requests'] += self.num_pages(term, window)
+        return results
+
+    def stream(self, terms, start_year, end_year, granularity='year'):
+        '''
+        streaming version of run(..., with_keywords=True): the documents are
+        yielded page by page, only page 0 of each (term, period) is kept
+
+        parameters
+        ----------
+        see docstring of run
+
+        yields
+        ------
+        (term, period, list of the documents of one page)
+        the number of hits is then available with hits(term, window)
+        '''
+        list_periods = period_windows(start_year, end_year, granularity)
+        period_of = dict((window, period) for period, window in list_periods)
+        windows = [window for period, window in list_periods]
+        unique_terms = unique(terms)
+
+        ########    stage 1: number of hits (page 0 of each term and year)
+        self.fetch([(term,) + window + (0,) for term in unique_terms
+                                            for window in windows],
+                   'hits', count_naive=False)
+        for term in terms:
+            for window in windows:
+                self.stats['naive_requests'] += 1 + self.num_pages(term, window)
+
+        ########    stage 2: all the pages, page 0 is reused
+        list_requests = [(term,) + window + (page,)
+                         for term in unique_terms
+                         for window in windows
+                         for page in range(self.num_pages(term, window))]
+        for req, data in self.iter_pages(list_requests, 'pages',
+                                         count_naive=False):
+            yield req[0], period_of[req[1:3]], data['response']['docs']
+
+    @property
+    def saved_requests(self):
+        return self.stats['naive_requests'] - self.stats['planned_requests']
+
+    def report(self):
+        '''
+        returns
+        -------
+        STR, summary of the requests planned, sent and saved
+        '''
+        return '{} requests planned instead of {} ({} saved), {} sent to the '\
+               'API (the others came from the cache)'\
+               .format(self.stats['planned_requests'],
+                       self.stats['naive_requests'], self.saved_requests,
+                       self.stats['sent_requests'])
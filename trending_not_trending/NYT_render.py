@@ -0,0 +1,199 @@
+'''
+python 2.7
+
+rendering of the wordclouds of a dashboard over several processes
+
+the layout of a wordcloud (placing each word without overlap) is CPU-bound,
+threads would wait for each other (GIL): the periods are rendered by a pool of
+processes, one per core by default. Each job only takes the frequencies of a
+period ({keyword: count}) and gives back the encoded image as bytes, so that no
+figure goes from one process to another.
+
+the image is saved straight from the wordcloud (PIL image) at the size
+asked, without matplotlib: no figure is created, nothing is left behind once
+the image is encoded, and the memory used does not grow with the number of
+periods (see NYT_render_bench.py).
+
+the images are kept in a directory (ImageCache) under the hash of what they
+are made of: the frequencies, the size, the format, the colormap and the
+version of the renderer. A dashboard built again, e.g. every night, only
+renders the periods whose keywords changed (usually the current one); the
+layout is drawn with a fixed seed, so the same inputs give the same image.
+
+usage:
+    d_frequencies = keyword_frequencies(d_keywords)
+    for period, png in render_wordclouds(d_frequencies):
+        ...
+'''
+
+import os
+import json
+import hashlib
+import tempfile
+from io import BytesIO
+from functools import partial
+from multiprocessing import Pool, cpu_count
+
+import wordcloud
+from wordcloud import WordCloud
+
+# to change when the rendering of render_wordcloud changes (the images cached
+# by a previous version are then made again)
+RENDERER_VERSION = 1
+
+EXTENSIONS = {'png': '.png', 'webp': '.webp'}
+
+
+def image_key(frequencies, width=400, height=200, image_format='png',
+              colormap=None):
+    '''
+    returns
+    -------
+    STR, hash of the inputs of render_wordcloud (and of the versions of the
+    renderer and of wordcloud)
+    '''
+    inputs = [sorted(frequencies.items()), width, height, image_format,
+              colormap, RENDERER_VERSION, wordcloud.__version__]
+    text = json.dumps(inputs, separators=(',', ':'), ensure_ascii=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class ImageCache(object):
+    '''
+    rendered images, one file per image named by its key (see image_key)
+
+    usage:
+        cache = ImageCache('nyt_images')
+        render_wordclouds(d_frequencies, cache=cache)
+        print(cache.report())
+    '''
+
+    def __init__(self, path='nyt_images'):
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.hits = 0
+        self.misses = 0
+
+    def filename(self, key, image_format='png'):
+        return os.path.join(self.path, key + EXTENSIONS[image_format])
+
+    def get(self, key, image_format='png'):
+        '''
+        returns
+        -------
+        the image as bytes, None if not cached
+        '''
+        try:
+            with open(self.filename(key, image_format), 'rb') as f:
+                data = f.read()
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key, data, image_format='png'):
+        '''
+        stores an image, through a temporary file so that a job running at the
+        same time never reads a partial image
+        '''
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.rename(tmp_path, self.filename(key, image_format))
+
+    def report(self):
+        '''
+        returns
+        -------
+        STR, number of images read from the cache and rendered
+        '''
+        return '{} images from the cache, {} rendered'.format(self.hits,
+                                                             self.misses)
+
+
+def render_wordcloud(frequencies, width=400, height=200, image_format='png',
+                     colormap=None):
+    '''
+    parameters
+    ----------
+    frequencies: as DICT, keyword -> count
+    width, height: as INT, defaults to 400 x 200 (as WordCloud)
+            size of the image in pixels
+    image_format: as STR, defaults to 'png'
+            'png' or 'webp' (smaller, if PIL was built with WebP)
+    colormap: as STR, optional
+            matplotlib colormap of the words, WordCloud's default if not given
+
+    returns
+    -------
+    the wordcloud as an image (bytes)
+    '''
+    cloud = WordCloud(width=width, height=height, colormap=colormap,
+                      random_state=0)
+    image = cloud.generate_from_frequencies(frequencies).to_image()
+    output = BytesIO()
+    if image_format == 'webp':
+        image.save(output, format='WEBP', quality=90)
+    else:
+        image.save(output, format='PNG')
+    return output.getvalue()
+
+
+def render_wordclouds(d_frequencies, processes=None, width=400, height=200,
+                      image_format='png', colormap=None, cache=None):
+    '''
+    parameters
+    ----------
+    d_frequencies: as DICT
+            keys are the periods (or any sortable key, e.g. (term, period)),
+            values are the frequencies of the period (see keyword_frequencies)
+    processes: as INT, optional
+            number of processes rendering the wordclouds, one per core if not
+            given (rendered in this process if 1)
+    width, height, image_format, colormap: see render_wordcloud
+    cache: as ImageCache, optional
+            images already rendered, only the periods missing from the cache
+            are rendered (and added to it)
+
+    returns
+    -------
+    list of (period, image as bytes), in the order of the periods (the
+    periods without keywords have no wordcloud)
+    '''
+    periods = sorted(period for period in d_frequencies
+                     if d_frequencies[period])
+    images = {}
+    keys = {}
+    if cache is not None:
+        for period in periods:
+            keys[period] = image_key(d_frequencies[period], width, height,
+                                     image_format, colormap)
+            data = cache.get(keys[period], image_format)
+            if data is not None:
+                images[period] = data
+    missing = [period for period in periods if period not in images]
+    jobs = [d_frequencies[period] for period in missing]
+
+    if jobs:
+        if processes is None:
+            processes = cpu_count()
+        render = partial(render_wordcloud, width=width, height=height,
+                         image_format=image_format, colormap=colormap)
+        if processes <= 1 or len(jobs) == 1:
+            rendered = [render(job) for job in jobs]
+        else:
+            pool = Pool(min(processes, len(jobs)))
+            try:
+                rendered = pool.map(render, jobs, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        for period, data in zip(missing, rendered):
+            images[period] = data
+            if cache is not None:
+                cache.put(keys[period], data, image_format)
+
+    return [(period, images[period]) for period in periods]
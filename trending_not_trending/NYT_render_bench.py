@@ -0,0 +1,164 @@
+'''
+python 2.7
+
+benchmark of the rendering of the wordclouds: the time per image and the peak
+memory (RSS) of the process are reported for
+- pyplot: the former path, a pyplot figure per period (imshow, savefig to a
+  buffer, base64), the figures are not closed
+- figures: produce_wordclouds and save_images_as_str, as in Explore.ipynb
+- direct: render_wordclouds (see NYT_render.py), the image is saved straight
+  from the wordcloud
+each one runs in a new process over the same synthetic keyword counts, so that
+the peak memory of a path does not hide the others
+
+usage:
+    $ python NYT_render_bench.py --periods 15 --keywords 200
+'''
+
+import time
+import random
+import resource
+import platform
+from io import BytesIO
+from multiprocessing import Pool
+
+import argparse #for command line
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import base64
+
+from wordcloud import WordCloud
+
+from NYT_api_advanced import produce_wordclouds, save_images_as_str
+from NYT_render import render_wordclouds
+
+
+def synthetic_frequencies(num_periods=15, num_keywords=200, seed=0):
+    '''
+    returns
+    -------
+    DICT, keys are the periods, values are DICT keyword -> count (a power
+    law, as the keywords of the NYT)
+    '''
+    rnd = random.Random(seed)
+    d_frequencies = {}
+    for period in range(2000, 2000 + num_periods):
+        words = ['Keyword {}'.format(rnd.randint(0, 10**6))
+                 for rank in range(num_keywords)]
+        d_frequencies[period] = dict((word, int(1000. / (rank + 1)) + 1)
+                                     for rank, word in enumerate(words))
+    return d_frequencies
+
+
+def render_pyplot(d_frequencies):
+    '''the former path (figures left open)'''
+    dict_str = {}
+    for period in d_frequencies:
+        fig = plt.figure()
+        wordcloud = WordCloud().generate_from_frequencies(d_frequencies[period])
+        plt.imshow(wordcloud)
+        plt.axis("off")
+        output = BytesIO()
+        fig.savefig(output, transparent=True, bbox_inches='tight')
+        encoded = base64.b64encode(output.getvalue()).decode('ascii')
+        dict_str[period] = encoded
+    return dict_str
+
+
+def render_figures(d_frequencies):
+    return save_images_as_str(produce_wordclouds(d_frequencies,
+                                                 plot_option=False))
+
+
+def render_direct(d_frequencies, width=400, height=200, image_format='png'):
+    return dict((period, base64.b64encode(image).decode('ascii'))
+                for period, image
+                in render_wordclouds(d_frequencies, processes=1, width=width,
+                                     height=height, image_format=image_format))
+
+
+RENDERERS = {'pyplot': render_pyplot,
+             'figures': render_figures,
+             'direct': render_direct}
+
+
+def peak_rss():
+    '''peak memory of the process, in MB'''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS
+    return peak / (1024. * 1024. if platform.system() == 'Darwin' else 1024.)
+
+
+def measure(job):
+    '''runs one renderer (in a new process), returns its measures as DICT'''
+    name, d_frequencies, kwargs = job
+    rss_before = peak_rss()
+    start = time.time()
+    dict_str = RENDERERS[name](d_frequencies, **kwargs)
+    wall_time = time.time() - start
+    return {'images': len(dict_str),
+            'time_per_image': wall_time / len(dict_str) if dict_str else 0.,
+            'kB_per_image': sum(len(s) for s in dict_str.values()) * 3 / 4.
+                            / 1024. / len(dict_str) if dict_str else 0.,
+            'rss_before': rss_before,
+            'peak_rss': peak_rss()}
+
+
+def run_benchmark(d_frequencies, names=('pyplot', 'figures', 'direct'),
+                  width=400, height=200, image_format='png'):
+    '''
+    returns
+    -------
+    DICT, keys are the names of the renderers, values are DICT with
+    'images', 'time_per_image' (s), 'kB_per_image', 'rss_before' and
+    'peak_rss' (MB)
+    '''
+    results = {}
+    for name in names:
+        kwargs = dict(width=width, height=height, image_format=image_format) \
+                 if name == 'direct' else {}
+        pool = Pool(1)
+        try:
+            results[name] = pool.apply(measure, ((name, d_frequencies,
+                                                  kwargs),))
+        finally:
+            pool.close()
+            pool.join()
+    return results
+
+
+def report(results):
+    '''
+    returns
+    -------
+    STR, one line per renderer
+    '''
+    lines = ['{:<10}{:>8}{:>14}{:>10}{:>14}{:>12}'.format('renderer', 'images',
+             's per image', 'kB/image', 'RSS start MB', 'peak RSS MB')]
+    for name in sorted(results):
+        r = results[name]
+        lines.append('{:<10}{:>8}{:>14.3f}{:>10.1f}{:>14.1f}{:>12.1f}'.format(
+                     name, r['images'], r['time_per_image'], r['kB_per_image'],
+                     r['rss_before'], r['peak_rss']))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of the rendering '
+                                                 'of the wordclouds')
+    parser.add_argument('--periods', type=int, default=15)
+    parser.add_argument('--keywords', type=int, default=200,
+                        help='number of keywords per wordcloud')
+    parser.add_argument('--width', type=int, default=400)
+    parser.add_argument('--height', type=int, default=200)
+    parser.add_argument('--format', dest='image_format', default='png',
+                        choices=['png', 'webp'],
+                        help='format of the direct rendering')
+    args = parser.parse_args()
+
+    print (report(run_benchmark(synthetic_frequencies(args.periods,
+                                                      args.keywords),
+                                width=args.width, height=args.height,
+                                image_format=args.image_format)))
@@ -0,0 +1,74 @@
+'''
+python 2.7
+
+compressed NDJSON file for the documents harvested from the NYT API
+
+one line per document: {"q": search term, "doc": document as returned by the
+API}, the file is written as the pages arrive (nothing is kept in memory) and
+can be read back as a stream with read_ndjson
+'''
+
+import gzip
+import json
+import threading
+
+
+class NDJSONSink(object):
+    '''
+    usage:
+        with NDJSONSink('docs.ndjson.gz') as sink:
+            for term, year, docs in planner.stream(terms, 2010, 2016):
+                sink.write(term, docs)
+    '''
+
+    def __init__(self, path, compresslevel=6):
+        '''
+        parameters
+        ----------
+        path: as STR
+              path to the file, compressed with gzip if it ends with '.gz'
+        compresslevel: as INT, defaults to 6
+              gzip compression level (1 is the fastest, 9 the smallest)
+        '''
+        self.path = path
+        if path.endswith('.gz'):
+            self._file = gzip.open(path, 'wb', compresslevel)
+        else:
+            self._file = open(path, 'wb')
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def write(self, search_term, docs):
+        '''writes the documents of a page, one line per document'''
+        lines = ''.join(json.dumps({'q': search_term, 'doc': doc}) + '\n'
+                        for doc in docs)
+        with self._lock:
+            self._file.write(lines.encode('utf-8'))
+            self.count += len(docs)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def read_ndjson(path):
+    '''
+    generator: reads a file written by NDJSONSink
+
+    yields
+    ------
+    (search term, document as DICT)
+    '''
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line.decode('utf-8'))
+                yield record['q'], record['doc']
@@ -0,0 +1,223 @@
+'''
+python 2.7
+
+rising keywords of a search term, from bounded summaries of the keywords of
+each year (or period)
+
+the exact counts of every keyword of every year grow with the corpus. For the
+keywords that matter here, the frequent ones, a Space-Saving summary per
+period is enough: at most 2 x capacity counters are kept, whatever the number
+of articles, and
+- every keyword seen more than `floor` times in the period has a counter
+- the counter of a keyword is above its true count by at most its `error`
+  (floor <= number of keywords of the period / capacity)
+
+the counters are pruned in batches (down to the capacity, when they reach
+twice the capacity) rather than one eviction per new keyword, so that adding
+a keyword costs a dictionary update.
+
+the lift of a keyword from one period to the next is the ratio of its shares
+of the keywords of the periods. It is computed with the lowest possible count
+of the period, and the highest possible count of the period before (+1 for
+the keywords never seen), so that a noisy counter cannot make a keyword look
+like it is rising.
+'''
+
+import json
+import heapq
+
+from NYT_windows import period_key
+
+
+class SpaceSaving(object):
+    '''
+    usage:
+        summary = SpaceSaving(capacity=1000)
+        summary.update(['Trump, Donald J', 'Presidential Election of 2016'])
+        summary.top_k(10)   # [(keyword, count, error), ...]
+    '''
+
+    def __init__(self, capacity=1000):
+        '''
+        parameters
+        ----------
+        capacity: as INT, defaults to 1000
+                number of counters kept after a pruning
+        '''
+        self.capacity = capacity
+        self.counters = {}      # keyword -> [count, error]
+        self.floor = 0          # highest count pruned so far
+        self.total = 0          # number of keywords added
+
+    def add(self, keyword, count=1):
+        self.total += count
+        counter = self.counters.get(keyword)
+        if counter is None:
+            # the keyword may have been pruned with a count up to floor
+            self.counters[keyword] = [self.floor + count, self.floor]
+            if len(self.counters) >= 2 * self.capacity:
+                self._prune()
+        else:
+            counter[0] += count
+
+    def update(self, keywords):
+        '''adds a LIST of keywords (e.g. of one article)'''
+        for keyword in keywords:
+            self.add(keyword)
+
+    def _prune(self):
+        '''keeps the capacity highest counters'''
+        kept = heapq.nlargest(self.capacity + 1, self.counters.items(),
+                              key=lambda item: item[1][0])
+        # the first counter pruned is the highest one pruned
+        self.floor = max(self.floor, kept[-1][1][0])
+        self.counters = dict(kept[:-1])
+
+    def estimate(self, keyword):
+        '''highest possible count of the keyword'''
+        counter = self.counters.get(keyword)
+        return counter[0] if counter is not None else self.floor
+
+    def lower_bound(self, keyword):
+        '''lowest possible count of the keyword'''
+        counter = self.counters.get(keyword)
+        return counter[0] - counter[1] if counter is not None else 0
+
+    def top_k(self, k=10):
+        '''
+        returns
+        -------
+        LIST of the k highest (keyword, count, error), the count being the
+        highest possible count of the keyword
+        '''
+        top = heapq.nlargest(k, self.counters.items(),
+                             key=lambda item: (item[1][0], -item[1][1]))
+        return [(keyword, count, error) for keyword, (count, error) in top]
+
+    def __len__(self):
+        return len(self.counters)
+
+
+class HeavyHitters(object):
+    '''
+    one SpaceSaving summary per period
+
+    usage:
+        hitters = HeavyHitters(capacity=1000)
+        for doc in docs:
+            year, list_keywords = extract_info(doc)
+            hitters.add(year, list_keywords)
+        hitters.emerging(2016, k=10)    # [(keyword, lift, count, before), ...]
+    '''
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.summaries = {}     # period -> SpaceSaving
+
+    def add(self, period, keywords):
+        '''adds the keywords (LIST of STR, e.g. of one article) to the period'''
+        summary = self.summaries.get(period)
+        if summary is None:
+            summary = self.summaries[period] = SpaceSaving(self.capacity)
+        summary.update(keywords)
+
+    def periods(self):
+        '''LIST of the periods with keywords, sorted'''
+        return sorted(self.summaries)
+
+    def top_k(self, period, k=10):
+        '''LIST of the k most frequent (keyword, count) of the period'''
+        return [(keyword, count) for keyword, count, error
+                in self.summaries[period].top_k(k)]
+
+    def lift(self, keyword, period, before):
+        '''
+        returns
+        -------
+        FLOAT, lowest possible share of the keyword in period divided by its
+        highest possible share in the period before
+        '''
+        now, prev = self.summaries[period], self.summaries[before]
+        if not now.total or not prev.total:
+            return 0.
+        share = float(now.lower_bound(keyword)) / now.total
+        share_before = float(prev.estimate(keyword) + 1) / prev.total
+        return share / share_before
+
+    def emerging(self, period, k=10, min_count=5):
+        '''
+        parameters
+        ----------
+        period: key of the period, compared with the period before it
+        k: as INT, defaults to 10
+                number of keywords returned
+        min_count: as INT, defaults to 5
+                the keywords seen fewer times in the period are ignored
+
+        returns
+        -------
+        LIST of the k (keyword, lift, count, count before) with the highest
+        lift, empty for the first period
+        '''
+        periods = self.periods()
+        i = periods.index(period)
+        if i == 0:
+            return []
+        before = periods[i - 1]
+        now, prev = self.summaries[period], self.summaries[before]
+        rising = [(keyword, self.lift(keyword, period, before),
+                   now.lower_bound(keyword), prev.lower_bound(keyword))
+                  for keyword in now.counters
+                  if now.lower_bound(keyword) >= min_count]
+        return heapq.nlargest(k, rising, key=lambda item: item[1])
+
+    def to_dict(self, granularity='year', k=10, min_count=5):
+        '''
+        returns
+        -------
+        DICT, keys are the keys of the periods (see NYT_windows.period_key),
+        values are DICT with
+        'top': LIST of [keyword, count], the k most frequent
+        'emerging': LIST of [keyword, lift, count, count before]
+        '''
+        return dict((period_key(period, granularity),
+                     {'top': [list(item) for item in self.top_k(period, k)],
+                      'emerging': [[keyword, round(lift, 3), count, before]
+                                   for keyword, lift, count, before
+                                   in self.emerging(period, k, min_count)]})
+                    for period in self.periods())
+
+    def report(self, granularity='year', k=5, min_count=5):
+        '''
+        returns
+        -------
+        STR, the k rising keywords of each period
+        '''
+        lines = []
+        for period in self.periods()[1:]:
+            rising = self.emerging(period, k, min_count)
+            lines.append('{}: {}'.format(period_key(period, granularity),
+                         ', '.join('{} (x{:.1f})'.format(keyword, lift)
+                                   for keyword, lift, count, before
+                                   in rising) or '-'))
+        return '\n'.join(lines)
+
+
+def write_emerging(d_hitters, filename='emerging.json', granularity='year',
+                   **kwargs):
+    '''
+    writes the top and rising keywords of several terms to a JSON file
+    {search term: {period key: {'top': ..., 'emerging': ...}}} (see
+    HeavyHitters.to_dict)
+
+    parameters
+    ----------
+    d_hitters: as DICT, keys are the search terms, values their HeavyHitters
+    filename: as STR, defaults to 'emerging.json'
+    granularity: as STR, defaults to 'year'
+    '''
+    content = dict((term, hitters.to_dict(granularity, **kwargs))
+                   for term, hitters in d_hitters.items())
+    with open(filename, 'w') as f:
+        json.dump(content, f, separators=(',', ':'), sort_keys=True)
+    return content
@@ -0,0 +1,133 @@
+'''
+python 2.7
+
+store of the trend results per (search term, year), kept in a SQLite file, so
+that a dashboard can be extended or refreshed without querying all the years
+again
+
+for each (term, year) the store keeps the number of hits and the counts of
+the keywords of the articles, as JSON {keyword: count} (the values of
+dict_hits and d_keywords in NYT_api_advanced.py)
+
+a year is stale, and must be queried again, when:
+- it is not in the store
+- it was stored while it was not over yet (current year at the time)
+- it was stored from the first 1000 articles only and a full harvest is asked
+'''
+
+import json
+import time
+import sqlite3
+import datetime
+from collections import Counter
+
+from NYT_keywords import KeywordStore
+
+
+class TrendStore(object):
+    '''
+    usage:
+        store = TrendStore('nyt_trends.sqlite')
+        years = store.stale_years('Donald Trump', range(2010, 2017))
+        ... query the API for those years only ...
+        store.save('Donald Trump', dict_hits, d_keywords)
+        dict_hits, d_keywords = store.load('Donald Trump', range(2010, 2017))
+    '''
+
+    def __init__(self, path='nyt_trends.sqlite'):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS trends (
+                                term TEXT NOT NULL,
+                                year INTEGER NOT NULL,
+                                hits INTEGER NOT NULL,
+                                keywords TEXT NOT NULL,
+                                complete INTEGER NOT NULL,
+                                full_harvest INTEGER NOT NULL,
+                                updated REAL NOT NULL,
+                                PRIMARY KEY (term, year))''')
+        self._conn.commit()
+
+    def stale_years(self, term, years, full_harvest=False):
+        '''
+        parameters
+        ----------
+        term: as STR, the search term
+        years: as LIST of INT
+        full_harvest: as BOOL, defaults to False
+                the years stored without a full harvest are stale if True
+
+        returns
+        -------
+        list of the years (among years) to query again
+        '''
+        stored = {}
+        for year, complete, full in self._conn.execute(
+                'SELECT year, complete, full_harvest FROM trends '
+                'WHERE term = ?', (term,)):
+            stored[year] = complete and (full or not full_harvest)
+        return [year for year in years if not stored.get(year, False)]
+
+    def save(self, term, dict_hits, d_keywords, full_harvest=False):
+        '''
+        parameters
+        ----------
+        term: as STR, the search term
+        dict_hits: as DICT, keys are years, values the number of hits
+        d_keywords: as KeywordStore, the keywords counted per year
+        full_harvest: as BOOL, defaults to False
+                whether the keywords come from all the articles of the year
+        '''
+        now = time.time()
+        current_year = datetime.date.today().year
+        self._conn.executemany('INSERT OR REPLACE INTO trends '
+                               'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                               [(term, year, dict_hits[year],
+                                 json.dumps(d_keywords.frequencies(year)
+                                            if year in d_keywords else {}),
+                                 int(year < current_year), int(full_harvest),
+                                 now)
+                                for year in dict_hits])
+        self._conn.commit()
+
+    def load(self, term, years):
+        '''
+        returns
+        -------
+        dict_hits and d_keywords (as KeywordStore) for the years (among years)
+        in the store
+        '''
+        years = set(years)
+        dict_hits, d_keywords = {}, KeywordStore()
+        for year, hits, keywords in self._conn.execute(
+                'SELECT year, hits, keywords FROM trends WHERE term = ?',
+                (term,)):
+            if year in years:
+                dict_hits[year] = hits
+                keywords = json.loads(keywords)
+                if isinstance(keywords, list):
+                    # stored as the list of the keywords by older versions
+                    keywords = Counter(keywords)
+                d_keywords.add_counts(year, keywords)
+        return dict_hits, d_keywords
+
+    def close(self):
+        self._conn.close()
+
+
+def year_runs(years):
+    '''
+    groups a list of years in runs of consecutive years
+
+    returns
+    -------
+    list of (start_year, end_year), e.g. [2010, 2011, 2016] gives
+    [(2010, 2011), (2016, 2016)]
+    '''
+    runs = []
+    for year in sorted(years):
+        if runs and runs[-1][1] == year - 1:
+            runs[-1] = (runs[-1][0], year)
+        else:
+            runs.append((year, year))
+    return runs
@@ -0,0 +1,128 @@
+'''
+python 2.7
+
+date windows for the queries to the NYT API
+
+the API restricts the results with begin_date and end_date, both included and
+formatted as 'YYYYMMDD'. A window is a tuple (begin_date, end_date) of STR.
+'''
+
+import datetime
+
+DATE_FORMAT = '%Y%m%d'
+
+
+def to_date(date_str):
+    '''converts 'YYYYMMDD' to a datetime.date'''
+    return datetime.datetime.strptime(str(date_str), DATE_FORMAT).date()
+
+
+def to_str(date):
+    '''converts a datetime.date to 'YYYYMMDD' '''
+    return date.strftime(DATE_FORMAT)
+
+
+def year_window(begin_year, end_year=None):
+    '''
+    returns
+    -------
+    the window from January 1st of begin_year to December 31st of end_year
+    (end_year defaults to begin_year)
+    '''
+    end_year = begin_year if end_year is None else end_year
+    return str(begin_year)+'0101', str(end_year)+'1231'
+
+
+def window_days(window):
+    '''number of days in the window (both ends included)'''
+    begin_date, end_date = window
+    return (to_date(end_date) - to_date(begin_date)).days + 1
+
+
+def split_window(window):
+    '''
+    splits a window in two halves (in days)
+
+    returns
+    -------
+    list of 2 windows, or [window] if the window is a single day
+    '''
+    begin, end = [to_date(d) for d in window]
+    if begin >= end:
+        return [window]
+    middle = begin + datetime.timedelta(days=(end - begin).days // 2)
+    return [(to_str(begin), to_str(middle)),
+            (to_str(middle + datetime.timedelta(days=1)), to_str(end))]
+
+
+########    periods of a trend (granularity of the bar chart)
+
+GRANULARITIES = ('year', 'quarter', 'month', 'week')
+
+
+def _month_end(year, month):
+    '''last day of the month as a datetime.date'''
+    if month == 12:
+        return datetime.date(year, 12, 31)
+    return datetime.date(year, month + 1, 1) - datetime.timedelta(days=1)
+
+
+def period_windows(start_year, end_year, granularity='year'):
+    '''
+    parameters
+    ----------
+    start_year: as INT
+            first year of the time range
+    end_year: as INT
+            last year of the time range (year included)
+    granularity: as STR, one of GRANULARITIES, defaults to 'year'
+            'year': the period is the year as INT, e.g. 2014
+            'quarter': e.g. '2014-Q1'
+            'month': e.g. '2014-03'
+            'week': the date of the first day, e.g. '2014-01-08' (the weeks
+                    start on January 1st of start_year, the last one may be
+                    shorter)
+
+    returns
+    -------
+    list of (period, window), in chronological order
+    '''
+    if granularity not in GRANULARITIES:
+        raise ValueError('granularity must be one of {}'.format(GRANULARITIES))
+
+    periods = []
+    if granularity == 'year':
+        for year in range(start_year, end_year+1):
+            periods.append((year, year_window(year)))
+    elif granularity in ('quarter', 'month'):
+        step = 3 if granularity == 'quarter' else 1
+        for year in range(start_year, end_year+1):
+            for month in range(1, 13, step):
+                if granularity == 'quarter':
+                    period = '{}-Q{}'.format(year, (month - 1) // 3 + 1)
+                else:
+                    period = '{}-{:02d}'.format(year, month)
+                begin = datetime.date(year, month, 1)
+                end = _month_end(year, month + step - 1)
+                periods.append((period, (to_str(begin), to_str(end))))
+    else:
+        begin = datetime.date(start_year, 1, 1)
+        last = datetime.date(end_year, 12, 31)
+        while begin <= last:
+            end = min(begin + datetime.timedelta(days=6), last)
+            periods.append((begin.isoformat(), (to_str(begin), to_str(end))))
+            begin = end + datetime.timedelta(days=1)
+    return periods
+
+
+def period_label(period, granularity='year'):
+    '''label of the bar of a period, e.g. 'year 2014', 'month 2014-03' '''
+    return '{} {}'.format(granularity, period)
+
+
+def period_key(period, granularity='year'):
+    '''
+    key of the image of a period in main.js: the label of the bar in lower
+    case, spaces replaced by '-' (e.g. 'year-2014', 'month-2014-03')
+    '''
+    return period_label(period, granularity).lower().replace(' ', '-')
@@ -0,0 +1,52 @@
+'''
+fixtures of the tests: a MockNYTServer (see NYT_mock_server.py) and a
+credentials file with dummy API keys, no API key or network connection needed
+
+    $ python -m pytest trending_not_trending/tests
+'''
+
+import os
+import sys
+
+import pytest
+
+# the scripts import each other from their directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from NYT_client import NYTClient, DOC_FIELDS
+from NYT_fetch import RateLimiter
+from NYT_mock_server import MockNYTServer
+
+
+def write_credentials(directory, num_keys=1):
+    '''credentials file with the keys mock-key-0, mock-key-1...'''
+    path = os.path.join(str(directory), 'credentials.yml')
+    with open(path, 'w') as f:
+        f.write('NYT_api_keys:\n')
+        for i in range(num_keys):
+            f.write('  - mock-key-{}\n'.format(i))
+    return path
+
+
+def make_client(credentials, server, **kwargs):
+    '''
+    client of the mock server, without the limits of the API (unless a
+    rate_limiter or a key_pool is given)
+    '''
+    if 'rate_limiter' not in kwargs and 'key_pool' not in kwargs:
+        kwargs['rate_limiter'] = RateLimiter(calls_per_second=1e6,
+                                             calls_per_day=10**9)
+    kwargs.setdefault('fields', DOC_FIELDS)
+    return NYTClient(credentials, url=server.url, **kwargs)
+
+
+@pytest.fixture
+def server():
+    server = MockNYTServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def credentials(tmpdir):
+    return write_credentials(tmpdir)
@@ -0,0 +1,76 @@
+'''
+a job run again is answered by the ResponseCache, a job resumed is answered by
+the HarvestJournal: no request reaches the mock server
+'''
+
+import os
+
+from NYT_cache import ResponseCache
+from NYT_journal import HarvestJournal, job_id
+from NYT_planner import TrendPlanner
+
+from conftest import make_client
+
+
+def run_job(credentials, server, **kwargs):
+    planner = TrendPlanner(client=make_client(credentials, server, **kwargs))
+    return planner.run(['A'], 2010, 2012, with_keywords=True)
+
+
+def test_cache_rerun_sends_no_request(credentials, server, tmpdir):
+    path = os.path.join(str(tmpdir), 'cache.sqlite')
+    cache = ResponseCache(path)
+    first = run_job(credentials, server, cache=cache)
+    cache.close()
+    assert server.stats['requests'] > 0
+
+    server.reset_stats()
+    cache = ResponseCache(path)
+    second = run_job(credentials, server, cache=cache)
+    cache.close()
+    assert server.stats['requests'] == 0
+    assert second == first
+
+
+def test_journal_resume_sends_no_request(credentials, server, tmpdir):
+    path = os.path.join(str(tmpdir), 'journal.sqlite')
+    job = job_id({'terms': ['A'], 'years': [2010, 2012]})
+    journal = HarvestJournal(path, job=job)
+    first = run_job(credentials, server, journal=journal)
+    sent = server.stats['requests']
+    assert journal.recorded == sent
+    journal.close()
+
+    server.reset_stats()
+    journal = HarvestJournal(path, resume=True, job=job)
+    second = run_job(credentials, server, journal=journal)
+    assert server.stats['requests'] == 0
+    assert journal.resumed == sent
+    assert second == first
+
+
+def test_journal_with_cache_keeps_marks_only(credentials, server, tmpdir):
+    cache = ResponseCache(os.path.join(str(tmpdir), 'cache.sqlite'))
+    journal = HarvestJournal(os.path.join(str(tmpdir), 'journal.sqlite'))
+    run_job(credentials, server, cache=cache, journal=journal)
+
+    assert journal.recorded == server.stats['requests']
+    bodies = journal._conn.execute('SELECT body FROM units').fetchall()
+    assert bodies and all(body == '' for body, in bodies)
+
+
+def test_new_job_keeps_the_units_of_the_other_jobs(tmpdir):
+    path = os.path.join(str(tmpdir), 'journal.sqlite')
+    params = {'q': 'A', 'begin_date': '20100101', 'end_date': '20101231',
+              'page': 0}
+    job_a = HarvestJournal(path, job=job_id({'terms': ['A']}))
+    job_a.record(params, 'body of A')
+
+    # job B starts (not resumed) while A is running
+    HarvestJournal(path, job=job_id({'terms': ['B']}))
+
+    job_a = HarvestJournal(path, resume=True, job=job_id({'terms': ['A']}))
+    assert job_a.get(params) == 'body of A'
+    # A started again: its units are removed
+    job_a = HarvestJournal(path, job=job_id({'terms': ['A']}))
+    assert job_a.get(params) is None
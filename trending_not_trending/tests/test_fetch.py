@@ -0,0 +1,81 @@
+'''
+rate limits and API keys: token bucket, daily quota, 429 cooldown and failover
+to the other keys
+'''
+
+import os
+import time
+
+import pytest
+
+from NYT_fetch import RateLimiter, KeyPool, QuotaStore, QuotaExceeded
+from NYT_mock_server import MockNYTServer
+
+from conftest import make_client, write_credentials
+
+
+def test_rate_limiter_spaces_the_first_calls():
+    limiter = RateLimiter(calls_per_second=20)
+    start = time.time()
+    for i in range(5):
+        limiter.acquire()
+    # no burst: the 5th call waits for 4 tokens
+    assert time.time() - start >= 4 / 20. * 0.9
+
+
+def test_rate_limiter_daily_quota():
+    limiter = RateLimiter(calls_per_second=1e6, calls_per_day=3)
+    for i in range(3):
+        limiter.acquire()
+    assert limiter.remaining_today == 0
+    with pytest.raises(QuotaExceeded):
+        limiter.acquire()
+
+
+def test_quota_store_is_shared_by_the_processes(tmpdir):
+    path = os.path.join(str(tmpdir), 'quota.sqlite')
+    first = RateLimiter(1e6, calls_per_day=3, store=QuotaStore(path), key='k')
+    first.acquire()
+    first.acquire()
+    # another process, started later the same day
+    second = RateLimiter(1e6, calls_per_day=3, store=QuotaStore(path), key='k')
+    assert second.remaining_today == 1
+    second.acquire()
+    with pytest.raises(QuotaExceeded):
+        first.acquire()
+
+
+def test_key_pool_fails_over_to_the_other_keys():
+    keys = KeyPool(['key-a', 'key-b'], calls_per_second=1e6, calls_per_day=2)
+    keys.throttled('key-a', wait=0.2)
+    # key-a cools down, key-b takes over until its quota is spent, then key-a
+    # is used again once cooled down
+    assert [keys.acquire() for i in range(4)] == ['key-b', 'key-b',
+                                                  'key-a', 'key-a']
+    with pytest.raises(QuotaExceeded):
+        keys.acquire()
+    assert keys.stats['key-a']['throttled'] == 1
+    assert keys.remaining_today == 0
+
+
+def test_429_cooldown_and_failover(tmpdir):
+    server = MockNYTServer(calls_per_second=2).start()
+    try:
+        credentials = write_credentials(tmpdir, num_keys=2)
+        keys = KeyPool(['mock-key-0', 'mock-key-1'], calls_per_second=1e6,
+                       calls_per_day=10**9)
+        client = make_client(credentials, server, key_pool=keys, backoff=0.5)
+        for page in range(8):
+            data = client.get_json(client.search_params('A', '20100101',
+                                                        '20101231', page))
+            assert data['response']['meta']['hits'] > 0
+    finally:
+        server.stop()
+
+    # the keys were throttled by the mock, the requests were sent again with
+    # the other key and all of them got an answer
+    assert server.stats['status'].get('429', 0) > 0
+    assert server.stats['status']['200'] == 8
+    assert sum(keys.stats[key]['throttled'] for key in keys.keys) == \
+           server.stats['status']['429']
+    assert all(keys.stats[key]['requests'] > 0 for key in keys.keys)
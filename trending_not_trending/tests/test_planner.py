@@ -0,0 +1,73 @@
+'''
+number of requests planned and sent by the TrendPlanner and the Harvester,
+against the mock server
+'''
+
+from NYT_planner import TrendPlanner
+from NYT_harvest import Harvester
+from NYT_mock_server import MockNYTServer, FixtureStore
+from NYT_windows import year_window
+
+from conftest import make_client
+
+
+def make_planner(credentials, server):
+    return TrendPlanner(client=make_client(credentials, server))
+
+
+def test_hits_repeated_term_is_queried_once(credentials, server):
+    planner = make_planner(credentials, server)
+    results = planner.run(['A', 'A', 'B'], 2010, 2012)
+
+    # page 0 of each (term, year), the repeated term is not queried again
+    assert server.stats['requests'] == 2 * 3
+    assert planner.stats['sent_requests'] == 6
+    assert planner.stats['naive_requests'] == 3 * 3
+    assert planner.saved_requests == 3
+    assert sorted(results['A']['hits']) == [2010, 2011, 2012]
+
+
+def test_keywords_reuse_page_0(credentials, server):
+    planner = make_planner(credentials, server)
+    planner.run(['A'], 2010, 2011)
+    server.reset_stats()
+    results = planner.run(['A'], 2010, 2011, with_keywords=True)
+
+    # only the pages after page 0 are sent
+    pages = sum(planner.num_pages('A', year_window(year))
+                for year in (2010, 2011))
+    assert server.stats['requests'] == pages - 2
+    for year in (2010, 2011):
+        assert len(results['A']['docs'][year]) == \
+               min(results['A']['hits'][year], 1000)
+
+
+def test_stream_counts_match_run(credentials, server):
+    planner = make_planner(credentials, server)
+    docs = sum(len(page) for term, period, page
+               in planner.stream(['A'], 2010, 2011))
+
+    assert docs == sum(planner.hits('A', year_window(year))
+                       for year in (2010, 2011))
+    assert planner.stats['planned_requests'] == server.stats['requests']
+    assert planner.saved_requests == 2
+
+
+def test_harvest_past_the_page_cap_saves_requests(credentials):
+    server = MockNYTServer(fixtures=FixtureStore(hits={'Big': 2500})).start()
+    try:
+        planner = make_planner(credentials, server)
+        harvester = Harvester(planner)
+        [(docs, stats)] = harvester.harvest('Big', [year_window(2016)])
+    finally:
+        server.stop()
+
+    assert stats['hits'] > 1000
+    assert stats['windows'] > 1
+    assert len(docs) == stats['docs']
+    # the hits of the parts are rounded by the mock, not always to the total
+    assert stats['coverage'] > 0.99
+    assert not stats['truncated_windows']
+    assert planner.stats['planned_requests'] == server.stats['requests']
+    # the naive approach probes the same windows and asks page 0 twice
+    assert planner.saved_requests == stats['windows']
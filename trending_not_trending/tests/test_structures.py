@@ -0,0 +1,86 @@
+'''
+compact structures of the keywords: IdSet, KeywordStore, CooccurrenceGraph and
+the SpaceSaving summaries, checked against exact counts
+'''
+
+import random
+from collections import Counter
+
+from NYT_dedup import IdSet, id_hash
+from NYT_keywords import KeywordStore
+from NYT_cooccurrence import CooccurrenceGraph
+from NYT_sketch import SpaceSaving
+
+
+def zipf_stream(n=20000, vocabulary=2000, seed=0):
+    '''keywords with a power law, as the keywords of the NYT'''
+    rnd = random.Random(seed)
+    # P(rank) is about proportional to 1 / (rank + 1)
+    return ['Keyword {}'.format(int(vocabulary ** rnd.random()) - 1)
+            for i in range(n)]
+
+
+def test_id_set_across_merges():
+    ids = IdSet(buffer_size=4)
+    hashes = [id_hash('A', i) for i in range(10)]
+    assert all(ids.add(h) for h in hashes)
+    assert not any(ids.add(h) for h in hashes)
+    assert len(ids) == 10
+    assert all(h in ids for h in hashes)
+    assert id_hash('B', 0) not in ids
+    # the same id under another scope is another article
+    assert ids.add(id_hash('B', 0))
+
+
+def test_keyword_store_top_k():
+    keywords = zipf_stream(5000, 300)
+    store = KeywordStore(buffer_size=512)
+    for i in range(0, len(keywords), 5):
+        store.add(2016, keywords[i:i + 5])
+    store.add_counts(2016, {'Keyword 0': 7, 'New Keyword': 3})
+
+    exact = Counter(keywords)
+    exact.update({'Keyword 0': 7, 'New Keyword': 3})
+    assert store.frequencies(2016) == dict(exact)
+    assert store.total(2016) == sum(exact.values())
+    top = store.top_k(2016, 10)
+    assert [count for keyword, count in top] == \
+           [count for keyword, count in exact.most_common(10)]
+    assert all(exact[keyword] == count for keyword, count in top)
+    assert store.top_k(2016, 0) == []
+
+
+def test_cooccurrence_top_edges():
+    graph = CooccurrenceGraph()
+    articles = [['a', 'b', 'c'], ['a', 'b'], ['a', 'b', 'b'], ['a', 'c'],
+                ['d']]
+    for keywords in articles:
+        graph.add(2016, keywords)
+
+    assert graph.articles(2016) == 5
+    edges = graph.top_edges(2016, k=5)
+    assert edges[0] == ('a', 'b', 3)
+    assert sorted(edges[1:]) == [('a', 'c', 2), ('b', 'c', 1)]
+    # only the strongest edge of each keyword
+    assert graph.top_edges(2016, k=1) == [('a', 'b', 3), ('a', 'c', 2)]
+    assert graph.top_edges(2016, min_count=2) == [('a', 'b', 3),
+                                                  ('a', 'c', 2)]
+
+
+def test_space_saving_bounds():
+    keywords = zipf_stream()
+    summary = SpaceSaving(capacity=100)
+    summary.update(keywords)
+    exact = Counter(keywords)
+
+    assert summary.total == len(keywords)
+    assert len(summary) < 2 * summary.capacity
+    assert summary.floor <= float(summary.total) / summary.capacity
+    for keyword, count in exact.items():
+        assert summary.lower_bound(keyword) <= count <= \
+               summary.estimate(keyword)
+        if count > summary.floor:
+            assert keyword in summary.counters
+    # the most frequent keywords are found
+    top = [keyword for keyword, count, error in summary.top_k(5)]
+    assert top == [keyword for keyword, count in exact.most_common(5)]